@@ -1,119 +1,45 @@
-from flask import Flask, request, render_template_string, send_from_directory
+from bisect import bisect_left, bisect_right
+import click
+from concurrent.futures import ProcessPoolExecutor
+import gc
+import json
+from flask import Flask, Response, abort, jsonify, request, render_template, url_for
 from functools import wraps
 import os
 import pandas as pd
+from bias_correction import correct_cycle
+from cycle_events import CycleEvents, cooperative
+from cycles import CycleWatcher, publish_cycle
+from forecast_archive import ForecastArchive, parse_issue_time
+from forecast_cache import FORECAST_DFS_DIR
+from forecast_store import column_list, pack_cycle
+from model_comparison import build_comparison
+from metrics import Metrics
+from image_pipeline import DERIVED_IMAGES_DIR, ImageManifest, build_location_images
+from page_cache import PageCache, page_response
+from plot_generation import generate_forecast_plots, generate_tide_plots
+from plot_index import is_cycle_stamped
+from prerender import PARALLEL_MIN_PAGES, write_site
+from spots import SpotRegistry
+from static_files import compress_directory, send_precompressed
+from surf_quality import SessionIndex, SessionIndexCache
+from tides import TIDE_CONSTITUENTS, TideTable, prediction_times
+from verification import LEAD_BUCKET_HOURS, OBSERVATIONS_DIR, REFERENCE_MODEL, Verification
 
-# Title information for locations
+# Spot registry (spots.json), with the spatial indexes behind /api/nearest and /api/spots
+spots = SpotRegistry()
+
+# Title information for locations: name, timezone, UTC offset, latitude, longitude
 title_info = {
-    'ballito': ['Ballito, Dolphin Coast, South Africa', 'SAST', 2, -29.532778, 31.224722],
-    'bells': ['Bells Beach, Victoria, Australia', 'AEST', 10, -38.372778, 144.28],
-    'cloudbreak': ['Cloudbreak, Fiji', 'FST', 12, -17.885833, 177.186667],
-    'el_salvador': ['Surf City, El Salvador', 'CST', -6, 13.491389, -89.381111],
-    'gland': ['G-Land, Banyuwangi, Indonesia', 'WIB', 7, -8.747222, 114.348611],
-    'huntington': ['Huntington Beach, California, USA', 'PDT', -7, 33.653611, -118.003611],
-    'jbay': ["Jeffreys's Bay, South Africa", 'SAST', 2, -34.033611, 24.934722],
-    'margies': ['Margaret River, Western Australia, Australia', 'AWST', 8, -33.976389, 114.9825],
-    'narrabeen': ['North Narrabeen, NSW, Australia', 'AEST', 10, -33.704722, 151.307778],
-    'oahu': ['North Shore, Oahu, Hawaii', 'HST', -10, 21.6640, -158.0539],
-    'peniche': ['Supertubos, Peniche, Portugal', 'WEST', 1, 39.343889, -9.365278],
-    'raglan': ['Raglan, New Zealand', 'NZST', 12, -37.810556, 174.828333],
-    'saquarema': ['Saquarema, Rio Di Janeiro, Brazil', 'BST', -3, -22.936944, -42.4825],
-    'snapper': ['Snapper Rocks, Queensland, Australia', 'AEST', 10, -28.161389, 153.549444],
-    'teahupoo': ['Teahupoo, Tahiti, French Polynesia', 'THAT', -10, -17.865556, -149.253056]
+    spot_id: [spot["name"], spot["timezone"], spot["utc_offset"], spot["lat"], spot["lon"]]
+    for spot_id, spot in spots.items()
 }
 
-position_ranges = {
-        'ballito': {
-            'wave_left': [65, 65, 65, 65],
-            'wave_top': [35, 45, 55, 65],
-            'wind_left': [50, 48, 46, 44],
-            'wind_top': [35, 45, 55, 65]
-        }, 
-        'bells': {
-            'wave_left': [55, 52, 49, 46],
-            'wave_top': [40, 50, 60, 70],
-            'wind_left': [40, 45, 50, 55],
-            'wind_top': [40, 30, 20, 10]
-        },
-        'cloudbreak': {
-            'wave_left': [40, 41, 42, 43],
-            'wave_top': [35, 45, 55, 65],
-            'wind_left': [60, 61, 62, 63],
-            'wind_top': [25, 35, 45, 55]
-        },
-        'el_salvador': {
-            'wave_left': [45, 48, 51, 54],
-            'wave_top': [50, 50, 50, 50],
-            'wind_left': [40, 45, 50, 55],
-            'wind_top': [12, 12, 12, 12]
-        },
-        'gland': {
-            'wave_left': [45, 48, 51, 54],
-            'wave_top': [55, 55, 55, 55],
-            'wind_left': [45, 48, 51, 54],
-            'wind_top': [30, 30, 30, 30]
-        },
-        'huntington': {
-            'wave_left': [43, 46, 49, 52],
-            'wave_top': [35, 38, 41, 44],
-            'wind_left': [57, 62, 67, 72],
-            'wind_top': [2, 12, 22, 32]
-        },
-        'jbay': {
-            'wave_left': [56, 52, 48, 44],
-            'wave_top': [50, 50, 50, 50],
-            'wind_left': [56, 52, 48, 44],
-            'wind_top': [10, 10, 10, 10]
-        },
-        'margies': {
-            'wave_left': [42, 42, 42, 42],
-            'wave_top': [22, 27, 32, 37],
-            'wind_left': [53, 53, 53, 53],
-            'wind_top': [50, 60, 70, 80]
-        },
-        'narrabeen': {
-            'wave_left': [56, 54, 52, 50],
-            'wave_top': [30, 45, 60, 75],
-            'wind_left': [39, 38, 37, 36],
-            'wind_top': [15, 25, 35, 45]
-        },
-        'oahu': {
-            'wave_left': [50, 45, 40, 35],
-            'wave_top': [20, 35, 50, 65],
-            'wind_left': [67, 64, 61, 58],
-            'wind_top': [30, 40, 50, 60]
-        },
-        'peniche': {
-            'wave_left': [43, 39, 35, 31],
-            'wave_top': [12, 24, 36, 48],
-            'wind_left': [66, 66, 66, 66],
-            'wind_top': [60, 70, 80, 90]
-        },
-        'raglan': {
-            'wave_left': [46, 44, 42, 40],
-            'wave_top': [30, 42, 54, 66],
-            'wind_left': [60, 58, 56, 54],
-            'wind_top': [34, 46, 58, 70]
-        },
-        'saquarema': {
-            'wave_left': [54, 51, 48, 45],
-            'wave_top': [60, 60, 60, 60],
-            'wind_left': [54, 51, 48, 45],
-            'wind_top': [20, 20, 20, 20]
-        },
-        'snapper': {
-            'wave_left': [55, 55, 55, 55],
-            'wave_top': [30, 45, 60, 75],
-            'wind_left': [35, 35, 35, 35],
-            'wind_top': [15, 30, 45, 60]
-        },
-        'teahupoo': {
-            'wave_left': [40, 47, 54, 61],
-            'wave_top': [45, 45, 45, 45],
-            'wind_left': [40, 47, 54, 61],
-            'wind_top': [5, 5, 5, 5]
-        }
-    }
+# Hours each location's forecast DateTimes are ahead of UTC
+utc_offsets = {spot_id: spot["utc_offset"] for spot_id, spot in spots.items()}
+
+# Where the wave and wind arrows are drawn on each location image
+position_ranges = {spot_id: spot["arrow_positions"] for spot_id, spot in spots.items()}
 
 # Flask app initialization
 app = Flask(__name__, static_folder='static')
@@ -122,6 +48,61 @@ app = Flask(__name__, static_folder='static')
 FORECAST_PLOTS_DIR = 'forecast_plots'
 TIDE_PLOTS_DIR = 'tide_plots'
 
+# Largest number of spots returned by one /api/spots or /api/nearest request
+MAX_SPOTS_PER_REQUEST = 500
+
+# Largest number of sessions returned by one /api/best request
+MAX_BEST_SESSIONS = 100
+
+# Limits of one /api/location/<location>/tide request
+MAX_TIDE_HOURS = 31 * 24
+MIN_TIDE_STEP_MINUTES = 1
+
+# Forecast models available for every location
+MODELS = ('gfs', 'ecmwf', 'corrected')
+
+# The live forecast cycle (published under cycles/, else the directories above) and its
+# caches: parsed forecasts and plot indexes, shared by all requests handled in this worker
+cycles = CycleWatcher(legacy_dirs=(FORECAST_DFS_DIR, FORECAST_PLOTS_DIR, TIDE_PLOTS_DIR))
+
+# Pushes newly published cycles to open pages over server-sent events, see /api/events
+cycle_events = CycleEvents(cycles, title_info, MODELS)
+
+# Rendered HTML pages, keyed by page and forecast version
+page_cache = PageCache()
+
+# Resized WebP/AVIF variants of the location images, see image_pipeline.py
+image_manifest = ImageManifest()
+
+# Archived forecasts checked against buoy observations, see verification.py
+verification = Verification()
+
+# Harmonic constants of each spot's tide, see tides.py
+tide_table = TideTable()
+
+# Surf-quality sessions of every spot and model, ranked once per cycle, see surf_quality.py
+session_indexes = SessionIndexCache()
+
+# Per-route, per-phase request timings and cache statistics, exposed at /metrics
+metrics = Metrics()
+metrics.init_app(app)
+metrics.add_cache('forecast', lambda: cycles.current().forecast_cache.stats())
+metrics.add_cache('page', page_cache.stats)
+
+# Preforking servers call this in the master process, before any worker forks (see
+# gunicorn.conf.py), so every worker inherits the loaded cycle instead of building its own
+def preload():
+    cycle = cycles.current()
+    loaded = cycle.forecast_cache.preload()
+    session_index(cycle)
+    for location in title_info:
+        cycle.corrected_plots.get(location)
+        cycle.tide_plots.get(location)
+    image_manifest.version()
+    # Stop the collector from touching (and so copying) the preloaded objects in each worker
+    gc.freeze()
+    return loaded
+
 # Password protection
 USERNAME = "SurfingAustralia"
 PASSWORD = ""
@@ -129,32 +110,17 @@ PASSWORD = ""
 def password_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        auth = request.authorization
-        if not auth or auth.username != USERNAME or auth.password != PASSWORD:
+        with metrics.phase('auth'):
+            auth = request.authorization
+            authorized = auth and auth.username == USERNAME and auth.password == PASSWORD
+        if not authorized:
             return ("Access Denied. Please provide valid credentials.", 401, 
                     {"WWW-Authenticate": "Basic realm='Login Required'"})
         return f(*args, **kwargs)
     return decorated_function
 
-# Homepage: Show links to locations
-@app.route("/")
-@password_required
-def index():
-    # Get available dates
-    plots = os.listdir(os.path.join(FORECAST_PLOTS_DIR, "corrected"))
-    
-    # Extract the forecast date from filenames
-    date = plots[0].split('_')[1].split('.')[0] if plots else "No Plots Available"
-    print(date)
-    # Get unique locations
-    locations = title_info.keys()
-    locations = [
-        {"name": title_info[loc][0], "lat": title_info[loc][3], "lon": title_info[loc][4], "url": f"/location/{loc}"}
-        for loc in title_info
-    ]
-
-    # Render HTML
-    html = """
+# Page templates
+INDEX_HTML = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -191,45 +157,43 @@ def index():
                 attribution: '© OpenStreetMap contributors'
             }).addTo(map);
             
-            // Add location markers
-            var locations = {{ locations | tojson }};
-            locations.forEach(function(loc) {
-                var marker = L.marker([loc.lat, loc.lon]).addTo(map);
-                marker.bindPopup(`<b>${loc.name}</b><br><a href="${loc.url}">View Forecast</a>`);
-            });
+            // Add location markers for the visible part of the map, fetched whenever it moves
+            var spotsUrl = {{ url_for('spots_in_bbox') | tojson }};
+            var markers = {};
+            var request = 0;
+            function loadMarkers() {
+                var current = ++request;
+                fetch(spotsUrl + '?bbox=' + map.getBounds().toBBoxString())
+                    .then(function(response) { return response.json(); })
+                    .then(function(data) {
+                        if (current !== request) {
+                            return; // A newer view has been requested since
+                        }
+                        var visible = {};
+                        data.spots.forEach(function(loc) {
+                            visible[loc.id] = true;
+                            if (!markers[loc.id]) {
+                                markers[loc.id] = L.marker([loc.lat, loc.lon]).addTo(map);
+                                markers[loc.id].bindPopup(`<b>${loc.name}</b><br><a href="${loc.url}">View Forecast</a>`);
+                            }
+                        });
+                        Object.keys(markers).forEach(function(id) {
+                            if (!visible[id]) {
+                                markers[id].remove();
+                                delete markers[id];
+                            }
+                        });
+                    });
+            }
+            map.on('moveend', loadMarkers);
+            loadMarkers();
         </script>
 
     </body>
     </html>
     """
-    return render_template_string(html, locations=locations, title_info=title_info, date=date)
-
-@app.route("/location/<location>")
-@password_required
-def location_page(location):
-    corrected_plot = next((f for f in os.listdir(os.path.join(FORECAST_PLOTS_DIR, "corrected")) if f.startswith(location)), None)
-    tide_plot = next((t for t in os.listdir(TIDE_PLOTS_DIR) if t.startswith(location)), None)
-    location_name = title_info.get(location, [location])[0]
-
-    location_image_path = os.path.join('static', 'location_images', f"{location}.png")
-
-    # Load the forecast DataFrames
-    gfs_location_forecast_df = pd.read_csv(os.path.join('static', 'forecast_dfs', 'gfs', f'{location}.csv'))
-    gfs_timesteps = gfs_location_forecast_df["DateTime"].tolist()
-    gfs_forecast_data = gfs_location_forecast_df.to_dict(orient="records")
-
-    ecmwf_location_forecast_df = pd.read_csv(os.path.join('static', 'forecast_dfs', 'ecmwf', f'{location}.csv'))
-    ecmwf_timesteps = ecmwf_location_forecast_df["DateTime"].tolist()
-    ecmwf_forecast_data = ecmwf_location_forecast_df.to_dict(orient="records")
 
-    corrected_location_forecast_df = pd.read_csv(os.path.join('static', 'forecast_dfs', 'corrected', f'{location}.csv'))
-    corrected_timesteps = corrected_location_forecast_df["DateTime"].tolist()
-    corrected_forecast_data = corrected_location_forecast_df.to_dict(orient="records")
-
-
-    arrow_positioning = position_ranges[location]
-
-    html = """
+LOCATION_HTML = """
    <!DOCTYPE html>
     <html>
         <head>
@@ -258,6 +222,11 @@ def location_page(location):
                     position: relative;
                     display: inline-block;
                 }
+                #location-image-container img {
+                    display: block;
+                    max-width: 100%;
+                    height: auto;
+                }
                 .arrow {
                     position: absolute;
                     width: 0;
@@ -340,38 +309,36 @@ def location_page(location):
                 }   
             </style>
             <script>
-                const gfsForecastData = {{ gfs_forecast_data | tojson }};
-                const ecmwfForecastData = {{ ecmwf_forecast_data | tojson }};
-                const correctedForecastData = {{ corrected_forecast_data | tojson }}
+                const spotId = {{ location | tojson }};
+                let shownCycle = {{ cycle | tojson }};
+                let forecastUrl = {{ url_for('location_forecast', location=location, cycle=cycle) | tojson }};
+                const forecastColumns = ['DateTime', 'Hsig_forecast', 'Tpeak_forecast', 'Wdir_forecast', 'wind_speed', 'wind_direction'];
+                const modelNames = { corrected: 'Corrected', gfs: 'GFSWave-v16', ecmwf: 'ECMWF-WAM' };
                 const arrow_pos = {{ arrow_positioning | tojson }};
-                let currentForecastData = correctedForecastData; // Default to corrected data
+                const cycleUrl = {{ url_for('cycle_update', location=location) | tojson }};
+                const cyclePollMs = 60000; // How often to check for a new cycle without an event stream
+                const loadedForecasts = {}; // Columnar forecasts already requested, by model
+                let currentForecast = null;
+                let currentModel = 'corrected';
     
                 let selectedTimestep = null; // Variable to store the selected timestep
                 
                 function updateAnnotations() {
                     const timestep = document.getElementById('timestep-selector').value;
                     selectedTimestep = timestep; // Store the selected timestep
-                    const data = currentForecastData.find(entry => entry.DateTime === timestep);
+                    const index = currentForecast ? currentForecast.DateTime.indexOf(timestep) : -1;
 
-                    if (!data) {
+                    if (index === -1) {
                         console.error("No data found for timestep:", timestep);
                         return;
                     }
 
+                    const data = {};
+                    forecastColumns.forEach(column => data[column] = currentForecast[column][index]);
+
+                    // Only the arrows change between timesteps; the image and key stay in place
                     const imageContainer = document.getElementById('location-image-container');
-                    imageContainer.innerHTML = `
-                        <img src="{{ url_for('static', filename='location_images/' + location + '.png') }}" alt="{{ location_name }}">
-                        <div class="key">
-                            <div class="key-item">
-                                <div class="key-color" style="background: red;"></div>
-                                <div class="key-text">Wave Direction</div>
-                            </div>
-                            <div class="key-item">
-                                <div class="key-color" style="background: chartreuse;"></div>
-                                <div class="key-text">Wind Direction</div>
-                            </div>
-                        </div>
-                    `;
+                    imageContainer.querySelectorAll('.arrow').forEach(arrow => arrow.remove());
 
                     // Define positions for wave arrows (bottom-left corner)
                     const wavePositions = [
@@ -426,52 +393,104 @@ def location_page(location):
 
                 }
 
-                // Load the timesteps when the page loads
-                function loadTimesteps() {
-                    const timesteps = {{ corrected_timesteps | tojson }}; // Adjust this according to the model
-                    const selector = document.getElementById('timestep-selector');
-                    selector.innerHTML = timesteps.map(ts => `<option value="${ts}">${ts}</option>`).join('');
-
-                    // Set the default selected timestep to the previously selected timestep or the first one
-                    selector.value = selectedTimestep || timesteps[0]; // Default to previously selected or first timestep
-                    updateAnnotations(); // Update annotations for the selected timestep
+                // Fetch only the columns the annotations need, once per model
+                function fetchForecast(model) {
+                    if (!loadedForecasts[model]) {
+                        const url = new URL(forecastUrl, window.location.href);
+                        url.searchParams.set('model', model);
+                        url.searchParams.set('columns', forecastColumns.join(','));
+                        loadedForecasts[model] = fetch(url)
+                            .then(response => response.json())
+                            .then(payload => payload.columns);
+                    }
+                    return loadedForecasts[model];
                 }
 
                 // Toggle between models
                 function toggleModel(model) {
-                    const modelMessageDiv = document.getElementById('model-message');
-
-                    let timesteps = [];
-                    // Update the data source based on the selected model
-                    if (model === 'GFSWave-v16') {
-                        currentForecastData = gfsForecastData; // Load GFS data
-                        timesteps = {{ gfs_timesteps | tojson }};
-                        modelMessageDiv.innerHTML = "You are viewing the GFSWave-v16 forecast model.";
-                    } else if (model === 'ECMWF-WAM') {
-                        currentForecastData = ecmwfForecastData; // Load ECMWF data
-                        timesteps = {{ ecmwf_timesteps | tojson }};
-                        modelMessageDiv.innerHTML = "You are viewing the ECMWF-WAM forecast model.";
-                    } else if (model === 'corrected') {
-                        currentForecastData = correctedForecastData; // Load corrected data
-                        timesteps = {{ corrected_timesteps | tojson }};
-                        modelMessageDiv.innerHTML = "You are viewing the Corrected forecast model.";
-                    }
+                    currentModel = model;
+                    fetchForecast(model).then(columns => {
+                        currentForecast = columns;
+                        const timesteps = columns.DateTime;
+                        document.getElementById('model-message').innerHTML = `You are viewing the ${modelNames[model]} forecast model.`;
 
-                    // Update the timestep selector with the correct timesteps for the selected model
-                    const selector = document.getElementById('timestep-selector');
-                    selector.innerHTML = timesteps.map(ts => `<option value="${ts}">${ts}</option>`).join('');
+                        // Update the timestep selector with the correct timesteps for the selected model
+                        const selector = document.getElementById('timestep-selector');
+                        selector.innerHTML = timesteps.map(ts => `<option value="${ts}">${ts}</option>`).join('');
 
-                    // Make sure the selected timestep is the same as before or the first one
-                    selector.value = selectedTimestep || timesteps[0]; // Use the previously selected timestep, if any
+                        // Keep the previously selected timestep if this model has it, otherwise use the first one
+                        selector.value = timesteps.includes(selectedTimestep) ? selectedTimestep : timesteps[0];
 
-                    // Trigger updateAnnotations with the selected timestep
-                    updateAnnotations();
-                    
+                        // Trigger updateAnnotations with the selected timestep
+                        updateAnnotations();
+                    });
                 }
 
+                // Point a plot iframe at another file and cycle
+                function showPlot(iframeId, filename) {
+                    const iframe = document.getElementById(iframeId);
+                    if (!iframe) {
+                        return false;
+                    }
+                    const url = new URL(iframe.src, window.location.href);
+                    url.pathname = url.pathname.replace(/[^/]*$/, filename);
+                    url.searchParams.set('cycle', shownCycle);
+                    iframe.src = url.pathname + url.search;
+                    return true;
+                }
 
+                // A newly published cycle: refetch only the forecasts and plots that changed
+                function applyCycle(update) {
+                    if (update.full) {
+                        window.location.reload();
+                        return;
+                    }
+                    const changes = update.locations[spotId] || {};
+                    shownCycle = update.cycle;
+                    const url = new URL(forecastUrl, window.location.href);
+                    url.searchParams.set('cycle', shownCycle);
+                    forecastUrl = url.pathname + url.search;
 
-                window.onload = loadTimesteps;
+                    (changes.forecasts || []).forEach(model => delete loadedForecasts[model]);
+                    if ((changes.forecasts || []).includes(currentModel)) {
+                        toggleModel(currentModel);
+                    }
+                    if (changes.corrected_plot) {
+                        showPlot('forecast-iframe', changes.corrected_plot);
+                    }
+                    if (changes.tide_plot && !showPlot('tide-iframe', changes.tide_plot)) {
+                        window.location.reload();
+                    }
+                }
+
+                // Ask for a newer cycle every cyclePollMs, where no event stream is available
+                function pollCycle() {
+                    setInterval(() => {
+                        const url = new URL(cycleUrl, window.location.href);
+                        url.searchParams.set('cycle', shownCycle);
+                        fetch(url)
+                            .then(response => response.status === 200 ? response.json() : null)
+                            .then(update => update && applyCycle(update))
+                            .catch(() => {});
+                    }, cyclePollMs);
+                }
+
+                window.onload = () => {
+                    toggleModel('corrected');
+                    // Published cycles are pushed to the page, so it never needs reloading for one.
+                    // A stream the server refuses (204) or drops for good is replaced by polling.
+                    if (shownCycle && window.EventSource) {
+                        const events = new EventSource({{ url_for('cycle_event_stream', location=location, cycle=cycle) | tojson }});
+                        events.addEventListener('cycle', event => applyCycle(JSON.parse(event.data)));
+                        events.onerror = () => {
+                            if (events.readyState === EventSource.CLOSED) {
+                                pollCycle();
+                            }
+                        };
+                    } else if (shownCycle) {
+                        pollCycle();
+                    }
+                };
             </script>
         </head>
         <body>
@@ -487,12 +506,12 @@ def location_page(location):
 
             The size of wind arrows indicate the forecasted wind speed. This forecast is not corrected, and is obtained from the ECMWF weather model for the closest grid point to the surf location.</body>
 
-            <iframe id="forecast-iframe" src="/forecast_plots/corrected/{{ corrected_plot if corrected_plot }}"></iframe>
+            <iframe id="forecast-iframe" src="{{ url_for('get_forecast_plot', model='corrected', filename=corrected_plot, cycle=cycle) if corrected_plot else '/forecast_plots/corrected/' }}"></iframe>
          
 
 
             {% if tide_plot %}
-                <iframe src="/tide_plots/{{ tide_plot }}"></iframe>
+                <iframe id="tide-iframe" src="{{ url_for('get_tide_plot', filename=tide_plot, cycle=cycle) }}"></iframe>
             {% else %}
                 <p>No tide plot available.</p>
             {% endif %}
@@ -513,8 +532,8 @@ def location_page(location):
 
             <div>
                 <a class="toggle-button" onclick="toggleModel('corrected')">Corrected</a>
-                <a class="toggle-button" onclick="toggleModel('GFSWave-v16')">GFSWave-v16</a>
-                <a class="toggle-button" onclick="toggleModel('ECMWF-WAM')">ECMWF-WAM</a>
+                <a class="toggle-button" onclick="toggleModel('gfs')">GFSWave-v16</a>
+                <a class="toggle-button" onclick="toggleModel('ecmwf')">ECMWF-WAM</a>
                 
             </div>
             <!-- Model Usage Message -->
@@ -523,26 +542,497 @@ def location_page(location):
             </div>
             <select id="timestep-selector" onchange="updateAnnotations()"></select>
             <div id="location-image-container">
+                {% if location_image %}
+                <picture>
+                    {% for source in location_image.sources %}
+                    <source type="{{ source.type }}" srcset="{{ source.srcset }}" sizes="(max-width: {{ location_image.width }}px) 100vw, {{ location_image.width }}px">
+                    {% endfor %}
+                    <img src="{{ url_for('static', filename='location_images/' + location + '.png') }}" width="{{ location_image.width }}" height="{{ location_image.height }}" alt="{{ location_name }}">
+                </picture>
+                {% else %}
                 <img src="{{ url_for('static', filename='location_images/' + location + '.png') }}" alt="{{ location_name }}">
+                {% endif %}
+                <div class="key">
+                    <div class="key-item">
+                        <div class="key-color" style="background: red;"></div>
+                        <div class="key-text">Wave Direction</div>
+                    </div>
+                    <div class="key-item">
+                        <div class="key-color" style="background: chartreuse;"></div>
+                        <div class="key-text">Wind Direction</div>
+                    </div>
+                </div>
             </div>
 
             <p><a href="/">Back to All Locations</a></p>
         </body>
     </html>
     """
-    return render_template_string(html, location=location, location_name=location_name, corrected_plot=corrected_plot, tide_plot=tide_plot, location_image_path=location_image_path, gfs_timesteps=gfs_timesteps, ecmwf_timesteps=ecmwf_timesteps, corrected_timesteps=corrected_timesteps, gfs_forecast_data=gfs_forecast_data, ecmwf_forecast_data=ecmwf_forecast_data, corrected_forecast_data=corrected_forecast_data, arrow_positioning=arrow_positioning)
+
+# Templates are compiled once at import instead of on every request
+index_template = app.jinja_env.from_string(INDEX_HTML)
+location_template = app.jinja_env.from_string(LOCATION_HTML)
+
+# Page builders shared by the views and prerender-site: each returns the page's cache key,
+# which identifies its version, and a function rendering it
+def index_page_parts(cycle):
+    # Forecast cycle date, taken from the newest corrected plot filename
+    date = cycle.corrected_plots.cycle_date() or "No Plots Available"
+
+    # Markers are loaded by the map itself, for the visible area only
+    return (
+        ('index', cycle.id, date),
+        lambda: render_template(index_template, date=date),
+    )
+
+def location_page_parts(cycle, location):
+    corrected_plot = cycle.corrected_plots.get(location)
+    tide_plot = cycle.tide_plots.get(location)
+    location_name = title_info.get(location, [location])[0]
+
+    location_image_path = os.path.join('static', 'location_images', f"{location}.png")
+    location_image = image_manifest.get(location)
+
+    arrow_positioning = position_ranges[location]
+
+    # The page embeds no forecast values, so the plots and images it links to identify its version
+    return (
+        ('location', location, cycle.id, corrected_plot, tide_plot, image_manifest.version()),
+        lambda: render_template(location_template, cycle=cycle.id, location=location, location_name=location_name, corrected_plot=corrected_plot, tide_plot=tide_plot, location_image_path=location_image_path, location_image=location_image, arrow_positioning=arrow_positioning),
+    )
+
+def serve_page(cycle, name, key, render):
+    # The pre-rendered copy from prerender-site while it is still current, else the cached render
+    if cycle.site.get(name, key):
+        return send_precompressed(cycle.site.directory, name)
+    with metrics.phase('render'):
+        page = page_cache.get_or_render(key, render)
+    return page_response(page)
+
+def render_pages(cycle_id, locations, include_index=False):
+    # {site path: (page cache key, html)} for the given location pages, and the index page
+    cycle = cycles.get(cycle_id)
+    pages = {}
+    with app.test_request_context('/'):
+        if include_index:
+            key, render = index_page_parts(cycle)
+            pages['index.html'] = (key, render())
+        for location in locations:
+            key, render = location_page_parts(cycle, location)
+            pages[f'location/{location}.html'] = (key, render())
+    return pages
+
+def prerender_cycle(cycle, workers=None):
+    # Write every page of a cycle to its site directory; large sites, or any site when workers
+    # is given, are rendered in one chunk of locations per process
+    locations = list(title_info)
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(locations) >= PARALLEL_MIN_PAGES else 1
+    if workers == 1:
+        return write_site(cycle.site.directory, render_pages(cycle.id, locations, include_index=True))
+
+    chunks = [locations[i::workers] for i in range(workers) if locations[i::workers]]
+    pages = {}
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        futures = [pool.submit(render_pages, cycle.id, chunk, i == 0) for i, chunk in enumerate(chunks)]
+        for future in futures:
+            pages.update(future.result())
+    return write_site(cycle.site.directory, pages)
+
+# Homepage: Show links to locations
+@app.route("/")
+@password_required
+def index():
+    with metrics.phase('lookup'):
+        cycle = cycles.current()
+        key, render = index_page_parts(cycle)
+    return serve_page(cycle, 'index.html', key, render)
+
+@app.route("/location/<location>")
+@password_required
+def location_page(location):
+    if location not in title_info:
+        abort(404)
+
+    with metrics.phase('lookup'):
+        cycle = cycles.current()
+        key, render = location_page_parts(cycle, location)
+    return serve_page(cycle, f'location/{location}.html', key, render)
+
+# Spots as map markers
+def spot_summary(spot_id):
+    spot = spots[spot_id]
+    return {"id": spot_id, "name": spot["name"], "lat": spot["lat"], "lon": spot["lon"],
+            "url": url_for('location_page', location=spot_id)}
+
+# Markers for the map's visible area: bbox=west,south,east,north as sent by Leaflet
+@app.route("/api/spots")
+@password_required
+def spots_in_bbox():
+    try:
+        west, south, east, north = (float(value) for value in request.args['bbox'].split(','))
+    except (KeyError, ValueError):
+        return jsonify(error="bbox must be west,south,east,north in degrees"), 400
+    found = spots.in_bbox(west, south, east, north)
+    return jsonify(
+        spots=[spot_summary(spot_id) for spot_id in found[:MAX_SPOTS_PER_REQUEST]],
+        truncated=len(found) > MAX_SPOTS_PER_REQUEST,
+    )
+
+# The k spots closest to a point, by great-circle distance
+@app.route("/api/nearest")
+@password_required
+def nearest_spots():
+    try:
+        lat, lon = float(request.args['lat']), float(request.args['lon'])
+        k = int(request.args.get('k', 5))
+    except (KeyError, ValueError):
+        return jsonify(error="lat and lon are required numbers, k an optional integer"), 400
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or not 1 <= k <= MAX_SPOTS_PER_REQUEST:
+        return jsonify(error=f"lat must be within ±90, lon within ±180 and k between 1 and {MAX_SPOTS_PER_REQUEST}"), 400
+    return jsonify(spots=[
+        {**spot_summary(spot_id), "distance_km": round(distance, 3)} for spot_id, distance in spots.nearest(lat, lon, k)
+    ])
+
+# Columnar forecast for one location and model, optionally restricted to columns and a time range
+@app.route("/api/location/<location>/forecast")
+@password_required
+def location_forecast(location):
+    if location not in title_info:
+        abort(404)
+
+    model = request.args.get('model', 'corrected')
+    if model not in MODELS:
+        return jsonify(error=f"Unknown model '{model}', expected one of {', '.join(MODELS)}"), 400
+
+    # Pages pass the cycle they were rendered from, so data and plots always match
+    with metrics.phase('load'):
+        forecast = cycles.get(request.args.get('cycle')).forecast_cache.get(model, location)
+
+    columns = request.args.get('columns')
+    names = columns.split(',') if columns else list(forecast.columns)
+    unknown = [name for name in names if name not in forecast.columns]
+    if unknown:
+        return jsonify(error=f"Unknown columns: {', '.join(unknown)}"), 400
+
+    # Timesteps are sorted 'YYYY-MM-DD HH:MM:SS' strings, so bounds are found by bisection.
+    # 'to' is inclusive of every timestep it prefixes, e.g. to=2025-09-11 covers the whole day.
+    timesteps = forecast.timesteps
+    start = bisect_left(timesteps, request.args['from'].replace('T', ' ')) if 'from' in request.args else 0
+    stop = bisect_right(timesteps, request.args['to'].replace('T', ' ') + '\uffff') if 'to' in request.args else len(timesteps)
+
+    with metrics.phase('serialize'):
+        return jsonify(
+            location=location,
+            model=model,
+            count=max(stop - start, 0),
+            columns={name: column_list(forecast.columns[name][0], forecast.columns[name][1][start:stop]) for name in names},
+        )
+
+# Predicted tide heights for one location: from (local time, default now), hours and step
+# (minutes). Times are the spot's local time, in the forecast's 'YYYY-MM-DD HH:MM:SS' format.
+@app.route("/api/location/<location>/tide")
+@password_required
+def location_tide(location):
+    if location not in title_info or location not in tide_table:
+        abort(404)
+    utc_offset = pd.Timedelta(hours=title_info[location][2])
+    try:
+        start = pd.Timestamp(request.args['from']) - utc_offset if 'from' in request.args else pd.Timestamp.now('UTC').tz_convert(None).floor('min')
+        hours = float(request.args.get('hours', 48))
+        step = int(request.args.get('step', 15))
+    except ValueError:
+        return jsonify(error="from must be a timestamp, hours a number and step an integer"), 400
+    if start.tzinfo is not None or not 0 < hours <= MAX_TIDE_HOURS or step < MIN_TIDE_STEP_MINUTES:
+        return jsonify(error=f"from must be a local time without offset, hours within (0, {MAX_TIDE_HOURS}] "
+                             f"and step at least {MIN_TIDE_STEP_MINUTES} minute"), 400
+
+    times = prediction_times(start, hours, step)
+    with metrics.phase('predict'):
+        heights = tide_table.predict([location], times)[0]
+    with metrics.phase('serialize'):
+        return jsonify(
+            location=location,
+            timezone=title_info[location][1],
+            utc_offset=title_info[location][2],
+            step_minutes=step,
+            times=(times + utc_offset).strftime('%Y-%m-%d %H:%M:%S').tolist(),
+            heights=heights.round(3).tolist(),
+        )
+
+# Every (model, location) forecast the site serves
+FORECAST_KEYS = [(model, location) for model in MODELS for location in title_info]
+
+def forecast_version(cycle):
+    # Published cycles never change; loose CSVs are versioned by their file signatures, which
+    # the cache re-reads at most once a second
+    return cycle.id or cycle.forecast_cache.version(FORECAST_KEYS)
+
+# Every location's models side by side with their spread, computed once per cycle
+@app.route("/api/compare")
+@password_required
+def compare_models():
+    cycle = cycles.current()
+    def render():
+        comparison, unavailable = build_comparison(cycle.forecast_cache, list(title_info), MODELS)
+        # Spots without a forecast from every model are listed with the models they lack
+        return json.dumps({"cycle": cycle.id, "models": MODELS, "locations": comparison, "unavailable": unavailable},
+                          separators=(',', ':'))
+
+    with metrics.phase('render'):
+        page = page_cache.get_or_render(('compare', forecast_version(cycle)), render)
+    return page_response(page, 'application/json')
+
+def session_index(cycle):
+    return session_indexes.get(forecast_version(cycle), lambda: SessionIndex(cycle.forecast_cache, spots, MODELS))
+
+def _epoch_arg(name, end=False):
+    # Query timestamp (UTC) -> epoch seconds; an 'end' given as a bare date covers that whole day
+    value = request.args.get(name)
+    if not value:
+        return None
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(None)
+    if end and len(value) == 10:
+        timestamp += pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+    return int(timestamp.value // 10**9)
+
+def _time_string(epoch, offset_hours=0):
+    # Epoch seconds -> 'YYYY-MM-DD HH:MM:SS', in UTC or shifted by offset_hours
+    return pd.Timestamp(epoch + int(offset_hours * 3600), unit='s').strftime('%Y-%m-%d %H:%M:%S')
+
+# The best surf sessions across spots: runs of good timesteps ranked by their peak score,
+# optionally peaking between from and to (UTC) and within one region
+@app.route("/api/best")
+@password_required
+def best_sessions():
+    model = request.args.get('model', 'corrected')
+    if model not in MODELS:
+        return jsonify(error=f"Unknown model '{model}', expected one of {', '.join(MODELS)}"), 400
+    try:
+        start, end = _epoch_arg('from'), _epoch_arg('to', end=True)
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify(error="from and to must be timestamps, limit an integer"), 400
+    if not 1 <= limit <= MAX_BEST_SESSIONS:
+        return jsonify(error=f"limit must be between 1 and {MAX_BEST_SESSIONS}"), 400
+
+    cycle = cycles.current()
+    with metrics.phase('load'):
+        index = session_index(cycle)
+    region = request.args.get('region') or None
+    if region is not None and region not in index.regions:
+        return jsonify(error=f"Unknown region '{region}', expected one of {', '.join(index.regions)}"), 400
+
+    with metrics.phase('query'):
+        sessions = index.best(model, start, end, region, limit)
+    return jsonify(cycle=cycle.id, model=model, sessions=[
+        {**spot_summary(session["location"]), "region": spots[session["location"]]["region"], "score": session["score"],
+         "peak": _time_string(session["peak"]), "start": _time_string(session["start"]), "end": _time_string(session["end"]),
+         "local_peak": _time_string(session["peak"], title_info[session["location"]][2])}
+        for session in sessions
+    ])
+
+# Server-sent events: a 'cycle' event whenever a new cycle is published, carrying what changed
+# (per location with location=). Browsers resume from Last-Event-ID; a new stream starts from
+# the cycle its page was rendered from. Only gevent workers serve streams; elsewhere the 204
+# tells the browser not to reconnect, and pages poll /api/cycle instead.
+@app.route("/api/events")
+@password_required
+def cycle_event_stream():
+    location = request.args.get('location')
+    if location is not None and location not in title_info:
+        abort(404)
+    if not cooperative():
+        return '', 204
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('cycle') or cycles.current().id
+    return Response(cycle_events.stream(last_id, location), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# The 'cycle' event a stream from cycle= would get next, if a newer cycle has been published
+# since; 204 if not. Answered at once, for pages that cannot keep a stream open.
+@app.route("/api/cycle")
+@password_required
+def cycle_update():
+    location = request.args.get('location')
+    if location is not None and location not in title_info:
+        abort(404)
+    found = cycle_events.wait(request.args.get('cycle') or cycles.current().id, location, timeout=0)
+    if found is None:
+        return '', 204
+    return Response(found[1], mimetype='application/json', headers={'Cache-Control': 'no-cache'})
+
+# Forecast error statistics per location, model and lead time, from the running aggregates
+@app.route("/api/verification")
+@password_required
+def verification_summary():
+    location = request.args.get('location')
+    if location and location not in title_info:
+        abort(404)
+    reference = request.args.get('reference', REFERENCE_MODEL)
+    if reference not in MODELS:
+        return jsonify(error=f"Unknown reference model '{reference}', expected one of {', '.join(MODELS)}"), 400
+    return jsonify(
+        reference=reference,
+        lead_bucket_hours=LEAD_BUCKET_HOURS,
+        statistics=verification.summary(
+            location=location, model=request.args.get('model'), column=request.args.get('column'),
+            reference=reference, pooled=request.args.get('pooled') == '1',
+        ),
+    )
 
 # Serve forecast plots dynamically by model
 @app.route("/forecast_plots/<model>/<filename>")
 @password_required
 def get_forecast_plot(model, filename):
-    return send_from_directory(os.path.join(FORECAST_PLOTS_DIR, model), filename)
+    if model not in MODELS:
+        abort(404)
+    cycle = cycles.get(request.args.get('cycle'))
+    return send_precompressed(os.path.join(cycle.forecast_plots_dir, model), filename, immutable=is_cycle_stamped(filename))
 
 # Serve tide plots
 @app.route("/tide_plots/<filename>")
 @password_required
 def get_tide_plot(filename):
-    return send_from_directory(TIDE_PLOTS_DIR, filename)
+    cycle = cycles.get(request.args.get('cycle'))
+    return send_precompressed(cycle.tide_plots_dir, filename, immutable=is_cycle_stamped(filename))
+
+# Location image variants carry their source hash in the filename, so they never change
+@app.route("/location_images/<filename>")
+@password_required
+def get_location_image(filename):
+    return send_precompressed(DERIVED_IMAGES_DIR, filename, immutable=True)
+
+# Prometheus scrape target: this worker's request timings, response sizes and cache statistics
+@app.route("/metrics")
+@password_required
+def metrics_endpoint():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Publish step: precompress the plot files once, instead of on every response
+@app.cli.command("compress-plots")
+def compress_plots():
+    """Write .gz/.br variants next to the forecast and tide plot files."""
+    cycle = cycles.current()
+    for directory in (cycle.forecast_plots_dir, cycle.tide_plots_dir):
+        written = compress_directory(directory)
+        print(f"{directory}: {written} compressed variants written")
+
+# Publish step: pack the cycle's CSVs into one memory-mapped columnar file
+@app.cli.command("pack-forecasts")
+def pack_forecasts():
+    """Pack static/forecast_dfs/<model>/<location>.csv into a single forecast store file."""
+    forecast_cache = cycles.current().forecast_cache
+    packed = pack_cycle(forecast_cache.base_dir, forecast_cache.store_path)
+    print(f"Packed {packed} forecasts into {forecast_cache.store_path}")
+
+# Publish step: run the bias-correction network over a cycle's GFS and ECMWF forecasts
+@app.cli.command("correct-forecasts")
+@click.argument("model_path")
+@click.option("--forecast-dfs", default=FORECAST_DFS_DIR, show_default=True, help="Directory holding <model>/<location>.csv.")
+@click.option("--workers", type=int, default=None, help="Processes to use (default: CPU count for large runs, else 1).")
+def correct_forecasts(model_path, forecast_dfs, workers):
+    """Write corrected/<location>.csv for every location using the network saved at MODEL_PATH."""
+    corrected = correct_cycle(model_path, forecast_dfs, workers=workers)
+    print(f"Corrected {corrected} locations in {forecast_dfs}")
+
+# Publish step: render each model's forecast plots, skipping those whose data has not changed
+@app.cli.command("generate-plots")
+@click.option("--cycle-date", required=True, help="Cycle date stamped on the filenames, as YYYYMMDDHH.")
+@click.option("--forecast-dfs", default=FORECAST_DFS_DIR, show_default=True, help="Directory holding <model>/<location>.csv.")
+@click.option("--out", default=FORECAST_PLOTS_DIR, show_default=True, help="Directory to write <model>/<location>_<date>.html to.")
+@click.option("--tide-out", default=TIDE_PLOTS_DIR, show_default=True, help="Directory to write <location>_<date>.html tide plots to.")
+@click.option("--constituents", type=click.Path(exists=True, dir_okay=False), default=None,
+              help=f"Tidal harmonic constants CSV (normally {TIDE_CONSTITUENTS}); tide plots are only generated with it.")
+@click.option("--workers", type=int, default=None, help="Processes to render with (default: CPU count for large runs, else 1).")
+def generate_plots(cycle_date, forecast_dfs, out, tide_out, constituents, workers):
+    """Write a forecast plot per model and location from the forecast CSVs, and a tide plot
+    per location from its tidal constants."""
+    if not cycle_date.isdigit():
+        raise click.BadParameter("must be digits, e.g. 2025091018", param_hint="--cycle-date")
+    titles = {location: info[0] for location, info in title_info.items()}
+    try:
+        rendered, reused = generate_forecast_plots(forecast_dfs, out, cycle_date, titles, workers)
+    except FileExistsError as e:
+        raise click.ClickException(str(e))
+    print(f"Rendered {rendered} plots, reused {reused} unchanged ones")
+
+    if constituents:
+        start = pd.Timestamp(parse_issue_time(cycle_date), unit='s')
+        spots_info = {location: (info[0], info[2]) for location, info in title_info.items()}
+        tides = generate_tide_plots(TideTable(constituents), tide_out, cycle_date, start, spots_info, workers=workers)
+        print(f"Rendered {tides} tide plots")
+    else:
+        print("No --constituents given, tide plots not generated")
+
+# Publish step: install a staged cycle and switch every worker to it
+@app.cli.command("publish-cycle")
+@click.argument("source_dir")
+@click.option("--cycle-id", default=None, help="Defaults to the date stamped on the corrected plots.")
+@click.option("--prerender/--no-prerender", default=True, show_default=True, help="Pre-render the new cycle's pages.")
+@click.option("--archive/--no-archive", default=True, show_default=True, help="Add the new cycle to the forecast archive.")
+def publish_cycle_command(source_dir, cycle_id, prerender, archive):
+    """Publish SOURCE_DIR (forecast_dfs/, forecast_plots/, tide_plots/) as the current cycle."""
+    cycle_id = publish_cycle(source_dir, cycle_id=cycle_id)
+    print(f"Published cycle {cycle_id}")
+    if archive:
+        try:
+            parse_issue_time(cycle_id)
+        except ValueError:
+            print(f"Not archived: cycle id {cycle_id} is not an issue time, use archive-cycle --issue-time")
+        else:
+            try:
+                ForecastArchive().append(cycles.get(cycle_id).forecast_dfs_dir, cycle_id, utc_offsets)
+                print(f"Archived cycle {cycle_id}")
+            except (ValueError, FileExistsError) as e:
+                print(f"Not archived: {e}")
+            else:
+                print(f"Verified {verification.update(ForecastArchive())} new forecast/observation pairs")
+    if prerender:
+        written = prerender_cycle(cycles.get(cycle_id))
+        print(f"Pre-rendered {written} pages")
+
+# Keep every cycle's forecasts for training and verification; publish-cycle does this by default
+@app.cli.command("archive-cycle")
+@click.option("--issue-time", default=None, help="Issue time as YYYYMMDDHH or ISO 8601 (default: the current cycle id).")
+@click.option("--forecast-dfs", default=None, help="Directory holding <model>/<location>.csv (default: the current cycle's).")
+def archive_cycle(issue_time, forecast_dfs):
+    """Append a cycle's GFS, ECMWF and corrected forecasts to the archive."""
+    cycle = cycles.current()
+    issue_time = issue_time or cycle.id
+    if not issue_time:
+        raise click.UsageError("The current cycle has no id; pass --issue-time.")
+    try:
+        entry = ForecastArchive().append(forecast_dfs or cycle.forecast_dfs_dir, issue_time, utc_offsets)
+    except (ValueError, FileExistsError) as e:
+        raise click.ClickException(str(e))
+    print(f"Archived {entry['forecasts']} forecasts as {entry['file']}")
+
+# Whenever a new observation batch arrives: fold newly verifiable forecasts into the statistics
+@app.cli.command("verify")
+@click.option("--observations", default=OBSERVATIONS_DIR, show_default=True, help="Directory holding <location>.csv buoy observations.")
+def verify(observations):
+    """Update the verification statistics with archived forecasts that now have observations."""
+    added = verification.update(ForecastArchive(), observations)
+    print(f"Verified {added} new forecast/observation pairs")
+
+# Publish step: render the whole site to static HTML, served in place of the views while current
+@app.cli.command("prerender-site")
+@click.option("--cycle-id", default=None, help="Defaults to the current cycle.")
+@click.option("--workers", type=int, default=None, help="Processes to render with (default: CPU count for large sites, else 1).")
+def prerender_site(cycle_id, workers):
+    """Render the index and every location page to HTML files with .gz/.br variants."""
+    cycle = cycles.get(cycle_id)
+    written = prerender_cycle(cycle, workers)
+    print(f"Pre-rendered {written} pages into {cycle.site.directory}")
+
+# Build step: resized location images, only for sources that changed
+@app.cli.command("build-images")
+def build_images():
+    """Write resized AVIF/WebP variants of the location images and their manifest."""
+    built = build_location_images()
+    print(f"Rebuilt images for {len(built)} locations: {', '.join(built) or 'none'}")
 
 # Run the Flask app
 if __name__ == "__main__":
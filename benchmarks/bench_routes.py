@@ -0,0 +1,319 @@
+"""Route benchmarks for the forecast app.
+
+Builds a synthetic forecast cycle for N locations in the app's on-disk layout
+(static/forecast_dfs/<model>/<location>.csv, forecast_plots/corrected/, tide_plots/),
+then drives the routes through the Flask test client and/or a local gunicorn, and
+reports latency percentiles, throughput, response bytes and peak RSS as JSON.
+
+    python benchmarks/bench_routes.py --locations 15 1000 --mode client gunicorn -o bench.json
+    python benchmarks/bench_routes.py --locations 15 --compare bench.json
+"""
+import argparse
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODELS = ('gfs', 'ecmwf', 'corrected')
+CYCLE_DATE = '2025091018'
+USERNAME, PASSWORD = "SurfingAustralia", ""
+COMPASS = np.array(['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW'])
+
+# Route name -> path template; {location} and {date} are filled per request
+ROUTES = {
+    'index': '/',
+    'location_page': '/location/{location}',
+    'forecast_api': '/api/location/{location}/forecast?model=corrected&columns=DateTime,Hsig_forecast,Tpeak_forecast,Wdir_forecast,wind_speed,wind_direction',
+    'compare_api': '/api/compare',
+    'spots_api': '/api/spots?bbox=-40,-30,40,30',
+    'nearest_api': '/api/nearest?lat=-33.8&lon=151.2&k=5',
+    'best_api': '/api/best?region=pacific&limit=10',
+    'forecast_plot': '/forecast_plots/corrected/{location}_{date}.html',
+    'tide_plot': '/tide_plots/{location}_{date}.html',
+}
+
+
+def make_dataset(root, n_locations, timesteps=47, plot_kb=20, compress=True, seed=0):
+    # Write one synthetic cycle and its spots.json under root; returns the spot ids
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2025-09-10 20:00', periods=timesteps, freq='3h').strftime('%Y-%m-%d %H:%M:%S')
+    locations = [f'spot_{i:05d}' for i in range(n_locations)]
+    for model in MODELS:
+        os.makedirs(os.path.join(root, 'static', 'forecast_dfs', model), exist_ok=True)
+    os.makedirs(os.path.join(root, 'forecast_plots', 'corrected'), exist_ok=True)
+    os.makedirs(os.path.join(root, 'tide_plots'), exist_ok=True)
+
+    plot_body = '<html><body>' + 'x' * (plot_kb * 1024) + '</body></html>'
+    spots = {}
+    for location in locations:
+        base = {
+            'swellheight1': rng.uniform(0, 3, timesteps), 'swellheight2': rng.uniform(0, 1, timesteps),
+            'swellheight3': rng.uniform(0, 0.5, timesteps), 'swellperiod1': rng.uniform(6, 18, timesteps),
+            'swellperiod2': rng.uniform(4, 12, timesteps), 'swellperiod3': rng.uniform(4, 12, timesteps),
+            'dir1': rng.uniform(0, 360, timesteps), 'dir2': rng.uniform(0, 360, timesteps),
+            'dir3': rng.uniform(0, 360, timesteps), 'wind_speed': rng.uniform(0, 12, timesteps),
+            'wind_direction': rng.uniform(0, 360, timesteps),
+        }
+        for model in MODELS:
+            df = pd.DataFrame({'DateTime': times})
+            df['Hsig_forecast'] = rng.uniform(0.3, 4, timesteps).astype(np.float32)
+            df['Tpeak_forecast'] = rng.uniform(5, 18, timesteps).astype(np.float32)
+            df['Wdir_forecast'] = rng.uniform(0, 360, timesteps).astype(np.float32)
+            for column, values in base.items():
+                df[column] = values.astype(np.float32)
+            for source, column in (('Wdir_forecast', 'Wdir_comp'), ('wind_direction', 'Wind_direction_comp'),
+                                   ('dir1', 'dir1_comp'), ('dir2', 'dir2_comp'), ('dir3', 'dir3_comp')):
+                df[column] = COMPASS[(df[source].to_numpy() // 22.5).astype(int) % 16]
+            df['wind_speed_kts'] = (df['wind_speed'] * 1.94384).astype(np.float32)
+            df.to_csv(os.path.join(root, 'static', 'forecast_dfs', model, f'{location}.csv'), index=False)
+        for directory in (os.path.join('forecast_plots', 'corrected'), 'tide_plots'):
+            with open(os.path.join(root, directory, f'{location}_{CYCLE_DATE}.html'), 'w') as f:
+                f.write(plot_body)
+        spots[location] = {
+            'name': f'Synthetic {location}', 'timezone': 'UTC', 'utc_offset': 0,
+            'lat': float(rng.uniform(-60, 60)), 'lon': float(rng.uniform(-180, 180)),
+            'arrow_positions': {key: [50, 50, 50, 50] for key in ('wave_left', 'wave_top', 'wind_left', 'wind_top')},
+            'region': str(rng.choice(['africa', 'americas', 'australia', 'pacific'])),
+            'swell_window': [float(rng.uniform(0, 360)), float(rng.uniform(0, 360))],
+            'offshore_wind': float(rng.uniform(0, 360)),
+        }
+    # Plots are precompressed on publish, so serve them the same way here
+    if compress:
+        from static_files import compress_directory
+        compress_directory(os.path.join(root, 'forecast_plots'))
+        compress_directory(os.path.join(root, 'tide_plots'))
+
+    # The app loads its spot registry from the working directory
+    with open(os.path.join(root, 'spots.json'), 'w') as f:
+        json.dump(spots, f)
+    return locations
+
+
+def summarise(route, latencies, sizes, errors, elapsed, peak_rss_kb):
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        'route': route,
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+        'mean_ms': round(float(latencies_ms.mean()), 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'bytes_mean': round(float(np.mean(sizes)), 1),
+        'peak_rss_kb': peak_rss_kb,
+    }
+
+
+def request_paths(route, locations, n_requests, seed):
+    rng = random.Random(seed)
+    template = ROUTES[route]
+    return [template.format(location=rng.choice(locations), date=CYCLE_DATE) for _ in range(n_requests)]
+
+
+def bench_client(locations, routes, n_requests, warmup):
+    # In-process: the Flask test client against a fresh import of the app in the dataset directory
+    sys.modules.pop('app', None)
+    import app as surf
+    client = surf.app.test_client()
+    headers = {'Authorization': 'Basic ' + base64.b64encode(f'{USERNAME}:{PASSWORD}'.encode()).decode(),
+               'Accept-Encoding': 'gzip'}
+
+    results = []
+    for route in routes:
+        for path in request_paths(route, locations, warmup, seed=1):
+            client.get(path, headers=headers)
+        latencies, sizes, errors = [], [], 0
+        started = time.perf_counter()
+        for path in request_paths(route, locations, n_requests, seed=2):
+            t = time.perf_counter()
+            response = client.get(path, headers=headers)
+            body = response.get_data()
+            latencies.append(time.perf_counter() - t)
+            sizes.append(len(body))
+            errors += response.status_code >= 400
+        elapsed = time.perf_counter() - started
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        results.append(summarise(route, latencies, sizes, errors, elapsed, peak_rss_kb))
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _process_tree_peak_rss_kb(pid):
+    # Sum of VmHWM over the gunicorn master and its workers (Linux only)
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        return None
+    total = 0
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+        except (OSError, StopIteration):
+            pass
+    return total
+
+
+def bench_gunicorn(workdir, locations, routes, n_requests, warmup, workers, concurrency):
+    # Out of process: a real gunicorn, configured like production, hit over HTTP from a thread pool
+    port = _free_port()
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO_DIR, 'gunicorn.conf.py'),
+        '--pythonpath', REPO_DIR, '-w', str(workers), '-b', f'127.0.0.1:{port}', 'app:app',
+    ]
+    server = subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+
+        headers = {'Authorization': 'Basic ' + base64.b64encode(f'{USERNAME}:{PASSWORD}'.encode()).decode(),
+                   'Accept-Encoding': 'gzip'}
+
+        def fetch(paths):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            timings = []
+            for path in paths:
+                t = time.perf_counter()
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+                timings.append((time.perf_counter() - t, len(body), response.status >= 400))
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+            connection.close()
+            return timings
+
+        results = []
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for route in routes:
+                list(pool.map(fetch, [request_paths(route, locations, warmup, seed=1)]))
+                paths = request_paths(route, locations, n_requests, seed=2)
+                batches = [paths[i::concurrency] for i in range(concurrency)]
+                started = time.perf_counter()
+                timings = [t for batch in pool.map(fetch, batches) for t in batch]
+                elapsed = time.perf_counter() - started
+                results.append(summarise(
+                    route, [t[0] for t in timings], [t[1] for t in timings], sum(t[2] for t in timings),
+                    elapsed, _process_tree_peak_rss_kb(server.pid),
+                ))
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    # Print p50/p95 changes against a previous run, matched on (mode, locations, route)
+    previous = {(r['mode'], r['locations'], r['route']): r for r in baseline['results']}
+    print(f"{'mode':9} {'locations':>9} {'route':15} {'p50 ms':>16} {'p95 ms':>16}")
+    for r in current['results']:
+        old = previous.get((r['mode'], r['locations'], r['route']))
+        if old is None:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms'):
+            change = (r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{r[key]:8.2f} {change:+6.1f}%")
+        print(f"{r['mode']:9} {r['locations']:>9} {r['route']:15} {cells[0]:>16} {cells[1]:>16}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--locations', type=int, nargs='+', default=[15], help='Dataset sizes to benchmark.')
+    parser.add_argument('--mode', nargs='+', choices=('client', 'gunicorn'), default=['client'])
+    parser.add_argument('--routes', nargs='+', choices=tuple(ROUTES), default=list(ROUTES))
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per route.')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per route first.')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads in gunicorn mode.')
+    parser.add_argument('--plot-kb', type=int, default=20, help='Size of each synthetic plot file.')
+    parser.add_argument('--no-compress', action='store_true', help='Do not precompress the synthetic plots.')
+    parser.add_argument('-o', '--output', help='Write results as JSON to this file (default: stdout).')
+    parser.add_argument('--compare', help='Previous results JSON to compare against.')
+    args = parser.parse_args(argv)
+
+    run = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'requests': args.requests,
+        },
+        'results': [],
+    }
+
+    sys.path.insert(0, REPO_DIR)
+    cwd = os.getcwd()
+    for n_locations in args.locations:
+        workdir = tempfile.mkdtemp(prefix=f'surf-bench-{n_locations}-')
+        try:
+            locations = make_dataset(workdir, n_locations, plot_kb=args.plot_kb, compress=not args.no_compress)
+            # The app resolves its data directories relative to the working directory
+            os.chdir(workdir)
+            for mode in args.mode:
+                if mode == 'client':
+                    results = bench_client(locations, args.routes, args.requests, args.warmup)
+                else:
+                    results = bench_gunicorn(workdir, locations, args.routes, args.requests, args.warmup,
+                                             args.workers, args.concurrency)
+                for result in results:
+                    run['results'].append({'mode': mode, 'locations': n_locations, **result})
+                    print(f"{mode:9} {n_locations:>7} {result['route']:15} p50 {result['p50_ms']:8.2f} ms  "
+                          f"p99 {result['p99_ms']:8.2f} ms  {result['throughput_rps']} req/s", file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+    else:
+        json.dump(run, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(run, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
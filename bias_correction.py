@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+import pandas as pd
+from forecast_cache import FORECAST_DFS_DIR
+
+# Column order of the corrected CSVs the app serves
+CORRECTED_COLUMNS = [
+    'DateTime', 'Hsig_forecast', 'Tpeak_forecast', 'Wdir_forecast', 'wind_speed', 'wind_direction',
+    'swellheight1', 'swellheight2', 'swellheight3', 'swellperiod1', 'swellperiod2', 'swellperiod3',
+    'dir1', 'dir2', 'dir3', 'Wdir_comp', 'Wind_direction_comp', 'dir1_comp', 'dir2_comp', 'dir3_comp',
+    'wind_speed_kts',
+]
+
+# The corrected forecast keeps this model's swell partitions and wind, and replaces the
+# columns the network predicts
+BASE_MODEL = 'ecmwf'
+
+# 16-point compass, as used by the *_comp columns: sector i covers [22.5 * i, 22.5 * (i + 1))
+COMPASS_POINTS = np.array(['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                           'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW'])
+
+# Direction column -> the compass column labelling it, rewritten whenever the direction is predicted
+COMPASS_COLUMNS = {'Wdir_forecast': 'Wdir_comp', 'wind_direction': 'Wind_direction_comp',
+                   'dir1': 'dir1_comp', 'dir2': 'dir2_comp', 'dir3': 'dir3_comp'}
+
+# Below this many locations the process pool costs more than it saves
+PARALLEL_MIN_LOCATIONS = 200
+
+
+def compass(degrees):
+    return COMPASS_POINTS[np.floor(np.mod(degrees, 360.0) / 22.5).astype(int) % 16]
+
+
+class BiasCorrectionModel:
+    # A trained feed-forward network saved as .npz with:
+    #   features      input names, '<model>.<column>' or '<model>.<column>.sin|cos' for directions
+    #   targets       output names, '<column>' or '<column>.sin|cos' (a sin/cos pair gives a direction)
+    #   x_mean, x_std, y_mean, y_std   normalisation applied around the network
+    #   W0, b0, W1, b1, ...            dense layers, ReLU between them and a linear output
+    def __init__(self, features, targets, weights, biases, x_mean, x_std, y_mean, y_std):
+        self.features = list(features)
+        self.targets = list(targets)
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.x_mean = np.asarray(x_mean, dtype=np.float32)
+        self.x_std = np.asarray(x_std, dtype=np.float32)
+        self.y_mean = np.asarray(y_mean, dtype=np.float32)
+        self.y_std = np.asarray(y_std, dtype=np.float32)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            n_layers = sum(1 for key in saved.files if key.startswith('W'))
+            return cls(
+                [str(f) for f in saved['features']], [str(t) for t in saved['targets']],
+                [saved[f'W{i}'] for i in range(n_layers)], [saved[f'b{i}'] for i in range(n_layers)],
+                saved['x_mean'], saved['x_std'], saved['y_mean'], saved['y_std'],
+            )
+
+    def save(self, path):
+        layers = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            layers[f'W{i}'] = w
+            layers[f'b{i}'] = b
+        np.savez(path, features=np.array(self.features), targets=np.array(self.targets),
+                 x_mean=self.x_mean, x_std=self.x_std, y_mean=self.y_mean, y_std=self.y_std, **layers)
+
+    def predict(self, X):
+        # One forward pass over every row: (n_rows, n_features) -> (n_rows, n_targets)
+        h = (np.asarray(X, dtype=np.float32) - self.x_mean) / self.x_std
+        for w, b in zip(self.weights[:-1], self.biases[:-1]):
+            h = np.maximum(h @ w + b, 0.0)
+        h = h @ self.weights[-1] + self.biases[-1]
+        return h * self.y_std + self.y_mean
+
+
+def _feature_column(frames, feature):
+    model, column, *transform = feature.split('.')
+    values = frames[model][column].to_numpy(dtype=np.float32)
+    if transform == ['sin']:
+        return np.sin(np.deg2rad(values))
+    if transform == ['cos']:
+        return np.cos(np.deg2rad(values))
+    return values
+
+
+def _load_location(forecast_dfs_dir, location, input_models):
+    # Input models aligned on DateTime, so every row is one valid time
+    frames = {model: pd.read_csv(os.path.join(forecast_dfs_dir, model, f'{location}.csv')) for model in input_models}
+    times = None
+    for df in frames.values():
+        times = df['DateTime'] if times is None else times[times.isin(df['DateTime'])]
+    return {model: df[df['DateTime'].isin(times)].reset_index(drop=True) for model, df in frames.items()}
+
+
+def _write_csv(df, path):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def correct_locations(model, locations, forecast_dfs_dir=FORECAST_DFS_DIR):
+    # Stack the inputs of every location into one (rows, features) array, run a single
+    # forward pass, then split the predictions back out and write corrected/<location>.csv.
+    input_models = sorted({feature.split('.')[0] for feature in model.features} | {BASE_MODEL})
+    loaded = [_load_location(forecast_dfs_dir, location, input_models) for location in locations]
+    if not loaded:
+        return 0
+
+    X = np.concatenate([
+        np.column_stack([_feature_column(frames, feature) for feature in model.features])
+        for frames in loaded
+    ])
+    Y = model.predict(X)
+
+    predicted = {}
+    for i, target in enumerate(model.targets):
+        column, *transform = target.split('.')
+        predicted.setdefault(column, {})[transform[0] if transform else 'value'] = Y[:, i]
+    outputs = {}
+    for column, parts in predicted.items():
+        if 'value' in parts:
+            outputs[column] = np.maximum(parts['value'], 0.0)
+        else:
+            outputs[column] = np.mod(np.rad2deg(np.arctan2(parts['sin'], parts['cos'])), 360.0).astype(np.float32)
+
+    out_dir = os.path.join(forecast_dfs_dir, 'corrected')
+    os.makedirs(out_dir, exist_ok=True)
+    start = 0
+    for location, frames in zip(locations, loaded):
+        stop = start + len(frames[BASE_MODEL])
+        corrected = frames[BASE_MODEL].copy()
+        for column, values in outputs.items():
+            corrected[column] = values[start:stop]
+            if column in COMPASS_COLUMNS:
+                corrected[COMPASS_COLUMNS[column]] = compass(values[start:stop])
+        _write_csv(corrected[CORRECTED_COLUMNS], os.path.join(out_dir, f'{location}.csv'))
+        start = stop
+    return len(locations)
+
+
+def _correct_chunk(model_path, locations, forecast_dfs_dir):
+    return correct_locations(BiasCorrectionModel.load(model_path), locations, forecast_dfs_dir)
+
+
+def correct_cycle(model_path, forecast_dfs_dir=FORECAST_DFS_DIR, locations=None, workers=None):
+    # Correct every location that has all the model's inputs. Large runs, or any run when
+    # workers is given, are split into one chunk per process; each chunk is still a single
+    # vectorised forward pass.
+    model = BiasCorrectionModel.load(model_path)
+    if locations is None:
+        input_models = {feature.split('.')[0] for feature in model.features} | {BASE_MODEL}
+        available = [
+            {filename[:-4] for filename in os.listdir(os.path.join(forecast_dfs_dir, m)) if filename.endswith('.csv')}
+            for m in input_models
+        ]
+        locations = sorted(set.intersection(*available))
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(locations) >= PARALLEL_MIN_LOCATIONS else 1
+    if workers == 1:
+        return correct_locations(model, locations, forecast_dfs_dir)
+
+    chunks = [list(chunk) for chunk in np.array_split(locations, workers) if len(chunk)]
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        futures = [pool.submit(_correct_chunk, model_path, chunk, forecast_dfs_dir) for chunk in chunks]
+        return sum(future.result() for future in futures)
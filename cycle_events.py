@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from cycles import FORECAST_DFS, FORECAST_PLOTS, TIDE_PLOTS
+
+# Streams are closed after this long and the browser reconnects, resuming from its last event
+STREAM_SECONDS = 600
+
+# A comment line is sent this often on an idle stream, so proxies keep it open
+HEARTBEAT_SECONDS = 15
+
+# Reconnection delay the browser is told to use, in milliseconds
+RETRY_MS = 5000
+
+
+def cooperative():
+    # True in gevent workers, where an idle stream is a parked greenlet rather than a thread.
+    # Anywhere else an open stream would hold a whole worker, so none are served.
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def cycle_delta(previous, cycle, locations, models):
+    # What a page on `previous` has to reload for `cycle`: per location, the models whose
+    # forecast changed and the plots whose content changed, compared by the manifests' hashes.
+    # Without a previous cycle everything has changed.
+    old_files = previous.manifest.get("files", {}) if previous is not None else {}
+    new_files = cycle.manifest.get("files", {})
+
+    def changed(old_path, new_path):
+        old, new = old_files.get(old_path), new_files.get(new_path)
+        return old is None or new is None or old["sha256"] != new["sha256"]
+
+    delta = {}
+    for location in locations:
+        forecasts = []
+        for model in models:
+            path = os.path.join(FORECAST_DFS, model, f'{location}.csv')
+            if changed(path, path):
+                forecasts.append(model)
+        entry = {}
+        if forecasts:
+            entry["forecasts"] = forecasts
+        for name, directory, plots in (("corrected_plot", os.path.join(FORECAST_PLOTS, "corrected"), 'corrected_plots'),
+                                       ("tide_plot", TIDE_PLOTS, 'tide_plots')):
+            filename = getattr(cycle, plots).get(location)
+            old_filename = getattr(previous, plots).get(location) if previous is not None else None
+            if filename and (not old_filename or changed(os.path.join(directory, old_filename), os.path.join(directory, filename))):
+                entry[name] = filename
+        if entry:
+            delta[location] = entry
+    return delta
+
+
+class CycleEvents:
+    # Broadcasts "cycle published" events to every open stream in this worker. One poller
+    # follows the cycle watcher; when the current cycle changes it computes the delta from the
+    # previous one and serialises it once, whole and per location, then wakes every waiting
+    # stream. The poller and its condition are created on first use in each process, after the
+    # fork and after gevent has patched threading.
+    def __init__(self, watcher, locations, models, poll_interval=1.0):
+        self.watcher = watcher
+        self.locations = list(locations)
+        self.models = tuple(models)
+        self.poll_interval = poll_interval
+        self._pid = None
+        self._condition = None
+        self._event = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._condition = threading.Condition()
+                current = self.watcher.current()
+                self._event = (current.id, None, current.manifest.get("published_at"), None)
+                threading.Thread(target=self._poll, name='cycle-events', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            cycle = self.watcher.current()
+            previous_id = self._event[0]
+            if cycle.id is None or cycle.id == previous_id:
+                continue
+            previous = self.watcher.get(previous_id) if previous_id else None
+            if previous is not None and previous.id != previous_id:
+                # Already pruned from disk
+                previous = None
+            event = self._serialise(previous_id, cycle, cycle_delta(previous, cycle, self.locations, self.models))
+            with self._condition:
+                self._event = (cycle.id, previous_id, cycle.manifest.get("published_at"), event)
+                self._condition.notify_all()
+
+    @staticmethod
+    def _serialise(previous_id, cycle, delta):
+        header = {"cycle": cycle.id, "previous": previous_id, "published_at": cycle.manifest.get("published_at")}
+        return {
+            "all": json.dumps({**header, "locations": delta}, separators=(',', ':')),
+            "unchanged": json.dumps({**header, "locations": {}}, separators=(',', ':')),
+            "locations": {location: json.dumps({**header, "locations": {location: entry}}, separators=(',', ':'))
+                          for location, entry in delta.items()},
+        }
+
+    def _published_at(self, cycle_id):
+        # When cycle_id was published, if it is still on disk
+        cycle = self.watcher.get(cycle_id)
+        return cycle.manifest.get("published_at") if cycle.id == cycle_id else None
+
+    def wait(self, last_id, location=None, timeout=HEARTBEAT_SECONDS):
+        # -> (cycle id, event data) once the current cycle differs from last_id, or None after
+        # timeout (0 to only check). A client that missed a cycle, so the delta is not from its
+        # last one, gets full=true instead and reloads everything. One whose page came from a
+        # worker that saw a newer cycle before this one did is not sent this worker's older one.
+        self._start()
+        since = self._published_at(last_id)
+
+        def published():
+            cycle_id, _, published_at, _ = self._event
+            return cycle_id not in (None, last_id) and not (since and published_at and published_at <= since)
+
+        with self._condition:
+            if not self._condition.wait_for(published, timeout):
+                return None
+            cycle_id, previous_id, _, event = self._event
+        if event is None or previous_id != last_id:
+            return cycle_id, json.dumps({"cycle": cycle_id, "previous": last_id, "full": True}, separators=(',', ':'))
+        if location is None:
+            return cycle_id, event["all"]
+        return cycle_id, event["locations"].get(location, event["unchanged"])
+
+    def stream(self, last_id, location=None, duration=None):
+        # Server-sent events until duration has passed: each published cycle as a 'cycle' event
+        # with its id, comment heartbeats in between
+        deadline = time.monotonic() + (duration or STREAM_SECONDS)
+        yield f'retry: {RETRY_MS}\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            found = self.wait(last_id, location, min(HEARTBEAT_SECONDS, remaining))
+            if found is None:
+                yield ': heartbeat\n\n'
+            else:
+                last_id, data = found
+                yield f'id: {last_id}\nevent: cycle\ndata: {data}\n\n'
@@ -0,0 +1,198 @@
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from forecast_cache import FORECAST_DFS_DIR, ForecastCache
+from forecast_store import FORECAST_STORE_NAME, pack_cycle
+from plot_index import PlotIndex, scan_plots
+from prerender import SITE_DIR, PrerenderedSite
+from static_files import compress_directory
+
+# Published cycles live in cycles/<cycle id>/, with cycles/current a symlink to the live one
+CYCLES_DIR = 'cycles'
+CURRENT_LINK = 'current'
+MANIFEST_NAME = 'manifest.json'
+
+# Per-cycle subdirectories, mirroring the legacy top-level layout
+FORECAST_DFS = 'forecast_dfs'
+FORECAST_PLOTS = 'forecast_plots'
+TIDE_PLOTS = 'tide_plots'
+
+# Superseded cycles kept on disk, so pages rendered just before a swap can still load their data
+KEEP_CYCLES = 3
+
+
+class Cycle:
+    # Everything derived from one forecast cycle's files. A request takes one Cycle and
+    # uses it throughout, so it never mixes data and plots from two different cycles.
+    def __init__(self, cycle_id, forecast_dfs_dir, forecast_plots_dir, tide_plots_dir, manifest=None, site_dir=SITE_DIR):
+        self.id = cycle_id
+        self.forecast_dfs_dir = forecast_dfs_dir
+        self.forecast_plots_dir = forecast_plots_dir
+        self.tide_plots_dir = tide_plots_dir
+        self.manifest = manifest or {}
+        self.forecast_cache = ForecastCache(forecast_dfs_dir)
+        self.corrected_plots = PlotIndex(os.path.join(forecast_plots_dir, "corrected"))
+        self.tide_plots = PlotIndex(tide_plots_dir)
+        self.site = PrerenderedSite(site_dir)
+
+    @classmethod
+    def from_directory(cls, cycle_dir):
+        with open(os.path.join(cycle_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        return cls(manifest["cycle"], os.path.join(cycle_dir, FORECAST_DFS),
+                   os.path.join(cycle_dir, FORECAST_PLOTS), os.path.join(cycle_dir, TIDE_PLOTS), manifest,
+                   os.path.join(cycle_dir, SITE_DIR))
+
+
+class CycleWatcher:
+    # Follows cycles/current in every worker process. The link is read at most once per
+    # poll_interval seconds; when its target changes the new cycle is loaded, so publishing
+    # needs no restart or signal. Without a cycles directory the legacy paths are used.
+    def __init__(self, cycles_dir=CYCLES_DIR, legacy_dirs=(FORECAST_DFS_DIR, 'forecast_plots', 'tide_plots'),
+                 poll_interval=1.0):
+        self.cycles_dir = cycles_dir
+        self.legacy_dirs = legacy_dirs
+        self.poll_interval = poll_interval
+        self._target = None
+        self._checked = 0.0
+        self._current = None
+        self._previous = {}
+        self._lock = threading.Lock()
+
+    def _read_target(self):
+        try:
+            return os.readlink(os.path.join(self.cycles_dir, CURRENT_LINK))
+        except (FileNotFoundError, OSError):
+            return None
+
+    def current(self):
+        now = time.monotonic()
+        if self._current is not None and now - self._checked < self.poll_interval:
+            return self._current
+        with self._lock:
+            target = self._read_target()
+            if self._current is None or target != self._target:
+                if self._current is not None and self._current.id is not None:
+                    self._previous[self._current.id] = self._current
+                if target is None:
+                    self._current = Cycle(None, *self.legacy_dirs)
+                else:
+                    self._current = Cycle.from_directory(os.path.join(self.cycles_dir, target))
+                    self._previous.pop(self._current.id, None)
+                self._target = target
+            self._checked = now
+            return self._current
+
+    def get(self, cycle_id):
+        # A specific cycle if it is still on disk, else the current one
+        current = self.current()
+        if not cycle_id or cycle_id == current.id:
+            return current
+        with self._lock:
+            # Forget cycles that have been pruned from disk
+            for old_id in [i for i in self._previous if not os.path.isdir(os.path.join(self.cycles_dir, i))]:
+                del self._previous[old_id]
+            cycle = self._previous.get(cycle_id)
+            if cycle is None:
+                cycle_dir = os.path.join(self.cycles_dir, cycle_id)
+                if os.path.basename(cycle_id) != cycle_id or not os.path.isfile(os.path.join(cycle_dir, MANIFEST_NAME)):
+                    return current
+                cycle = self._previous[cycle_id] = Cycle.from_directory(cycle_dir)
+            return cycle
+
+
+def _file_manifest(root):
+    files = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 16), b''):
+                    digest.update(chunk)
+            files[os.path.relpath(path, root)] = {"bytes": os.path.getsize(path), "sha256": digest.hexdigest()}
+    return files
+
+
+def _default_cycle_id(source_dir):
+    # The cycle date stamped on the corrected plots, else the publish time
+    date = scan_plots(os.path.join(source_dir, FORECAST_PLOTS, "corrected"))[1]
+    return date or datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+
+
+def publish_cycle(source_dir, cycles_dir=CYCLES_DIR, cycle_id=None, keep=KEEP_CYCLES):
+    # Publish a staged cycle (source_dir holding forecast_dfs/, forecast_plots/ and tide_plots/):
+    # copy it under cycles_dir, pack and precompress it, write its manifest, then swap
+    # cycles/current to it with a single rename. Readers see either the old cycle or the
+    # complete new one, never a mix. Returns the cycle id.
+    cycle_id = cycle_id or _default_cycle_id(source_dir)
+    if os.path.basename(cycle_id) != cycle_id or cycle_id in (CURRENT_LINK, ''):
+        raise ValueError(f"Invalid cycle id {cycle_id!r}")
+    cycle_dir = os.path.join(cycles_dir, cycle_id)
+    if os.path.exists(cycle_dir):
+        raise FileExistsError(f"Cycle {cycle_id} has already been published")
+
+    os.makedirs(cycles_dir, exist_ok=True)
+    staging_dir = os.path.join(cycles_dir, f".staging-{cycle_id}-{os.getpid()}")
+    try:
+        for name in (FORECAST_DFS, FORECAST_PLOTS, TIDE_PLOTS):
+            source = os.path.join(source_dir, name)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(staging_dir, name))
+            else:
+                os.makedirs(os.path.join(staging_dir, name))
+
+        pack_cycle(os.path.join(staging_dir, FORECAST_DFS), os.path.join(staging_dir, FORECAST_DFS, FORECAST_STORE_NAME))
+        compress_directory(os.path.join(staging_dir, FORECAST_PLOTS))
+        compress_directory(os.path.join(staging_dir, TIDE_PLOTS))
+
+        manifest = {
+            "cycle": cycle_id,
+            "published_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "files": _file_manifest(staging_dir),
+        }
+        with open(os.path.join(staging_dir, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+        os.rename(staging_dir, cycle_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    # Atomic pointer swap: build the new link beside the old one and rename over it
+    link_path = os.path.join(cycles_dir, CURRENT_LINK)
+    tmp_link = f"{link_path}.tmp{os.getpid()}"
+    os.symlink(cycle_id, tmp_link)
+    os.replace(tmp_link, link_path)
+
+    prune_cycles(cycles_dir, keep)
+    return cycle_id
+
+
+def list_cycles(cycles_dir=CYCLES_DIR):
+    # Published cycle ids, oldest first
+    cycles = []
+    if os.path.isdir(cycles_dir):
+        for name in os.listdir(cycles_dir):
+            cycle_dir = os.path.join(cycles_dir, name)
+            manifest_path = os.path.join(cycle_dir, MANIFEST_NAME)
+            # Skip the current link and in-progress staging directories
+            if not name.startswith('.') and not os.path.islink(cycle_dir) and os.path.isfile(manifest_path):
+                with open(manifest_path) as f:
+                    cycles.append((json.load(f)["published_at"], name))
+    return [name for _, name in sorted(cycles)]
+
+
+def prune_cycles(cycles_dir=CYCLES_DIR, keep=KEEP_CYCLES):
+    # Remove all but the newest `keep` superseded cycles; the current one is never removed
+    try:
+        current = os.readlink(os.path.join(cycles_dir, CURRENT_LINK))
+    except (FileNotFoundError, OSError):
+        current = None
+    superseded = [name for name in list_cycles(cycles_dir) if name != current]
+    for name in superseded[:max(len(superseded) - keep, 0)]:
+        shutil.rmtree(os.path.join(cycles_dir, name), ignore_errors=True)
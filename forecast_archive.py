@@ -0,0 +1,254 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timezone
+import json
+import os
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+from forecast_store import FORECAST_STORE_NAME, ForecastStore, pack_bytes
+
+# Every archived cycle is one packed forecast file (forecast_store.py) under
+# archive/<year>/<month>/<issue time>.fcst, listed in archive/catalog.json by issue time.
+# Forecast DateTimes are each spot's local time; the catalog keeps the UTC offset of every
+# location in the cycle, and queries take and return valid times in UTC.
+ARCHIVE_DIR = 'archive'
+CATALOG_NAME = 'catalog.json'
+
+# Cycle ids are issue times in this format, e.g. 2025091018
+ISSUE_FORMAT = '%Y%m%d%H'
+
+
+def _epoch(value):
+    # Timestamp-like (string, datetime, numpy) -> epoch seconds, naive values taken as UTC
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(None)
+    return int(timestamp.value // 10**9)
+
+
+def parse_issue_time(value):
+    # Cycle id (see ISSUE_FORMAT), epoch seconds or timestamp -> epoch seconds
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, str) and value.isdigit():
+        value = datetime.strptime(value, ISSUE_FORMAT)
+    return _epoch(value)
+
+
+class ForecastArchive:
+    # Append-only history of forecast cycles. The catalog, sorted by issue time, is the first
+    # level of the index; within a cycle, the packed file's (model, location) row ranges and
+    # their sorted valid times are the rest. A query bisects the catalog for the cycles that can
+    # contain an answer, then bisects each forecast's valid times in the memory-mapped file,
+    # reading only the rows it returns.
+    def __init__(self, archive_dir=ARCHIVE_DIR, max_open=64):
+        self.archive_dir = archive_dir
+        self.catalog_path = os.path.join(archive_dir, CATALOG_NAME)
+        self.max_open = max_open
+        self._catalog_signature = None
+        self._entries = []
+        self._issues = []
+        self._max_lead = 0
+        self._appended = []
+        self._sequences = []
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _catalog(self):
+        try:
+            st = os.stat(self.catalog_path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        with self._lock:
+            if signature != self._catalog_signature:
+                entries = []
+                if signature is not None:
+                    with open(self.catalog_path) as f:
+                        entries = json.load(f)["cycles"]
+                self._entries = entries
+                self._issues = [entry["issue"] for entry in entries]
+                self._max_lead = max((entry["max_lead"] for entry in entries), default=0)
+                # Catalogs written before sequences were recorded number every entry 0
+                self._appended = sorted(entries, key=lambda entry: entry.get("sequence", 0))
+                self._sequences = [entry.get("sequence", 0) for entry in self._appended]
+                self._catalog_signature = signature
+            return self._entries, self._issues, self._max_lead
+
+    def _store(self, entry):
+        path = os.path.join(self.archive_dir, entry["file"])
+        with self._lock:
+            store = self._stores.get(path)
+            if store is not None:
+                self._stores.move_to_end(path)
+                return store
+        store = ForecastStore(path)
+        with self._lock:
+            self._stores[path] = store
+            while len(self._stores) > self.max_open:
+                self._stores.popitem(last=False)
+        return store
+
+    def entries(self, after=None):
+        # Catalog entries (issue, file, forecasts, max_lead, utc_offsets, sequence), oldest issue
+        # first; only those issued after `after` (epoch seconds) when it is given
+        entries, issues, _ = self._catalog()
+        return entries[bisect_right(issues, after):] if after is not None else list(entries)
+
+    def entry(self, issue_time):
+        # The catalog entry of one archived cycle; KeyError if it is not archived
+        issue = parse_issue_time(issue_time)
+        entries, issues, _ = self._catalog()
+        position = bisect_left(issues, issue)
+        if position == len(issues) or issues[position] != issue:
+            raise KeyError(f"No cycle issued at {issue_time} is archived")
+        return entries[position]
+
+    def appended(self, since):
+        # Catalog entries archived after sequence number `since`, in the order they were archived
+        self._catalog()
+        with self._lock:
+            appended, sequences = self._appended, self._sequences
+        return appended[bisect_right(sequences, since):]
+
+    def append(self, forecast_dfs_dir, issue_time, utc_offsets):
+        # Archive one cycle's forecasts; utc_offsets gives each location's offset in hours. The
+        # cycle's packed file is hard-linked when it exists (published cycles have one, and
+        # pruning them then costs no archive space), else the CSVs are packed. Raises
+        # FileExistsError if the issue time is already archived, ValueError if a location in the
+        # cycle has no UTC offset.
+        issue = parse_issue_time(issue_time)
+        entries, issues, _ = self._catalog()
+        position = bisect_left(issues, issue)
+        if position < len(issues) and issues[position] == issue:
+            raise FileExistsError(f"Cycle issued at {issue_time} is already archived")
+
+        issued = datetime.fromtimestamp(issue, timezone.utc)
+        relative_path = os.path.join(f'{issued:%Y}', f'{issued:%m}', f'{issued:{ISSUE_FORMAT}}.fcst')
+        path = os.path.join(self.archive_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        packed_path = os.path.join(forecast_dfs_dir, FORECAST_STORE_NAME)
+        if os.path.isfile(packed_path):
+            try:
+                os.link(packed_path, tmp_path)
+            except OSError:
+                shutil.copyfile(packed_path, tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                f.write(pack_bytes(forecast_dfs_dir)[0])
+        os.replace(tmp_path, path)
+
+        store = ForecastStore(path)
+        locations = sorted({location for _, location in store.index})
+        missing = [location for location in locations if location not in utc_offsets]
+        if missing:
+            os.remove(path)
+            raise ValueError(f"No UTC offset for {', '.join(missing)}")
+        offsets = {location: utc_offsets[location] for location in locations}
+
+        # The longest lead in the cycle bounds how far back valid_at() has to look
+        valid_times = store.column("DateTime")[1]
+        last_valid = max((int(valid_times[stop - 1]) - round(offsets[location] * 3600)
+                          for (_, location), (start, stop) in store.index.items() if stop > start), default=issue)
+        # Sequence numbers give the archiving order, so cycles archived late can be found
+        sequence = max((entry.get("sequence", 0) for entry in entries), default=0) + 1
+        entry = {"issue": issue, "file": relative_path, "forecasts": len(store.index),
+                 "max_lead": max(last_valid - issue, 0), "utc_offsets": offsets, "sequence": sequence}
+
+        entries = entries[:position] + [entry] + entries[position:]
+        tmp_catalog = f"{self.catalog_path}.tmp{os.getpid()}"
+        with open(tmp_catalog, 'w') as f:
+            json.dump({"cycles": entries}, f, indent=1)
+        os.replace(tmp_catalog, self.catalog_path)
+        return entry
+
+    def valid_at(self, time, locations=None, models=None, columns=None):
+        # Every archived forecast for valid time `time`, one row per (cycle, model, location)
+        target = _epoch(time)
+        entries, issues, max_lead = self._catalog()
+        start, stop = bisect_left(issues, target - max_lead), bisect_right(issues, target)
+        return self._collect([(entry, target, target) for entry in entries[start:stop]], locations, models, columns)
+
+    def cycle_between(self, issue_time, start=None, end=None, locations=None, models=None, columns=None):
+        # One archived cycle's forecasts valid between start and end inclusive, either open when None
+        entry = self.entry(issue_time)
+        first_valid = _epoch(start) if start is not None else entry["issue"] - 10**10
+        last_valid = _epoch(end) if end is not None else entry["issue"] + 10**10
+        return self._collect([(entry, first_valid, last_valid)], locations, models, columns)
+
+    def lead_time(self, hours, start, end, locations=None, models=None, columns=None):
+        # Forecasts made `hours` ahead, for valid times between start and end inclusive
+        lead = int(round(hours * 3600))
+        entries, issues, _ = self._catalog()
+        first, last = bisect_left(issues, _epoch(start) - lead), bisect_right(issues, _epoch(end) - lead)
+        targets = [(entry, entry["issue"] + lead, entry["issue"] + lead) for entry in entries[first:last]]
+        return self._collect(targets, locations, models, columns)
+
+    @staticmethod
+    def _frame(entry, store, rows, keys, counts, shifts, columns):
+        # DataFrame of the given rows of one cycle's store; keys, counts and shifts per forecast
+        times = store.column("DateTime")[1]
+        frame = {
+            "issue_time": np.full(len(rows), entry["issue"], dtype='datetime64[s]'),
+            "valid_time": (times[rows] - np.repeat(shifts, counts).astype(np.int64)).astype('datetime64[s]'),
+            "model": np.repeat([model for model, _ in keys], counts).astype(object),
+            "location": np.repeat([location for _, location in keys], counts).astype(object),
+        }
+        for name in columns or store.column_names:
+            if name == 'DateTime':
+                continue
+            column, values = store.column(name)
+            if column["kind"] == "category":
+                # Missing values are code -1, which picks the trailing None
+                categories = np.array(column["categories"] + [None], dtype=object)
+                frame[name] = categories[values[rows]]
+            else:
+                frame[name] = values[rows]
+        frame = pd.DataFrame(frame)
+        if not len(rows):
+            # Nothing to infer text columns from: give them the dtype pandas infers for strings
+            frame = frame.astype({name: pd.Series(['']).dtype for name in frame.columns if frame[name].dtype == object})
+        return frame
+
+    def _collect(self, targets, locations, models, columns):
+        # targets: [(catalog entry, first valid time, last valid time)] in UTC -> DataFrame of the
+        # matching rows. Entries archived before offsets were recorded are taken as UTC.
+        locations = set(locations) if locations is not None else None
+        models = set(models) if models is not None else None
+        frames = []
+        for entry, first_valid, last_valid in targets:
+            store = self._store(entry)
+            times = store.column("DateTime")[1]
+            utc_offsets = entry.get("utc_offsets", {})
+            keys, ranges, shifts = [], [], []
+            for (model, location), (row_start, row_stop) in store.index.items():
+                if (models is not None and model not in models) or (locations is not None and location not in locations):
+                    continue
+                # Stored times are local: shift the UTC bounds into them
+                shift = round(utc_offsets.get(location, 0) * 3600)
+                valid = times[row_start:row_stop]
+                first = row_start + int(np.searchsorted(valid, first_valid + shift, side='left'))
+                last = row_start + int(np.searchsorted(valid, last_valid + shift, side='right'))
+                if first < last:
+                    keys.append((model, location))
+                    ranges.append(np.arange(first, last))
+                    shifts.append(shift)
+            if not ranges:
+                continue
+
+            counts = [len(r) for r in ranges]
+            frames.append(self._frame(entry, store, np.concatenate(ranges), keys, counts, shifts, columns))
+
+        if not frames:
+            # No rows: the schema a result with rows would have, from any archived cycle
+            entry = targets[0][0] if targets else (self._catalog()[0] or [None])[-1]
+            if entry is None:
+                names = [c for c in columns or [] if c != 'DateTime']
+                return pd.DataFrame(columns=["issue_time", "valid_time", "lead_hours", "model", "location"] + names)
+            frames.append(self._frame(entry, self._store(entry), np.zeros(0, dtype=np.int64), [], [], [], columns))
+        result = pd.concat(frames, ignore_index=True)
+        result.insert(2, "lead_hours", (result["valid_time"] - result["issue_time"]).dt.total_seconds() / 3600)
+        return result
@@ -0,0 +1,167 @@
+from collections import OrderedDict, namedtuple
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from forecast_store import FORECAST_STORE_NAME, ForecastStore, encode_column, list_forecast_csvs, pack_bytes
+
+# Directory holding the per-model forecast CSVs
+FORECAST_DFS_DIR = os.path.join('static', 'forecast_dfs')
+
+# Parsed forecast for one (model, location) pair, tagged with the file signature it was read
+# from: its 'YYYY-MM-DD HH:MM:SS' timesteps and {column: (column header, numpy array)} in the
+# packed file's encoding. Entries hold arrays only, views into the store where there is one, so
+# forked workers share them without the refcount writes that Python lists of floats cause.
+ForecastEntry = namedtuple('ForecastEntry', ['signature', 'timesteps', 'columns'])
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ForecastCache:
+    # Bounded LRU of parsed forecasts, invalidated when the source file's mtime or size changes.
+    # The source is the packed cycle file (forecast_store.py) or else the preloaded in-memory
+    # store, each only while the CSV is unchanged since it was packed, else the CSV itself.
+    def __init__(self, base_dir=FORECAST_DFS_DIR, max_entries=256, poll_interval=1.0):
+        self.base_dir = base_dir
+        self.poll_interval = poll_interval
+        self.store_path = os.path.join(base_dir, FORECAST_STORE_NAME)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._store = None
+        self._preloaded = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def path(self, model, location):
+        return os.path.join(self.base_dir, model, f'{location}.csv')
+
+    def _current_store(self):
+        # (signature, ForecastStore) for the packed cycle file, reopened when it is replaced;
+        # None when only CSVs exist
+        try:
+            signature = file_signature(self.store_path)
+        except FileNotFoundError:
+            return None
+        store = self._store
+        if store is None or store[0] != signature:
+            store = (signature, ForecastStore(self.store_path))
+            self._store = store
+        return store
+
+    def _source(self, model, location):
+        # -> (signature, store holding the forecast), with store None when the CSV must be read.
+        # A CSV edited or rewritten (correct-forecasts) after packing wins over the pack.
+        key = (model, location)
+        try:
+            signature = file_signature(self.path(model, location))
+        except FileNotFoundError:
+            signature = None
+        store = self._current_store()
+        if store is not None and key in store[1] and (signature is None or store[1].sources.get(key) == signature):
+            return ('store',) + store[0], store[1]
+        if signature is None:
+            raise FileNotFoundError(self.path(model, location))
+        preloaded = self._preloaded
+        if preloaded is not None and preloaded[0].get(key) == signature:
+            return ('preloaded',) + signature, preloaded[1]
+        return signature, None
+
+    def get(self, model, location):
+        signature, store = self._source(model, location)
+        key = (model, location)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Parse outside the lock so one slow read does not block other locations
+        if store is not None:
+            entry = self._load_columns(signature, store.columns(model, location))
+        else:
+            entry = self._load_csv(self.path(model, location), signature)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def arrays(self, model, location, names):
+        # {column: array} for numeric columns; zero-copy views into the packed store when it exists
+        columns = self.get(model, location).columns
+        return {name: columns[name][1] for name in names}
+
+    def _signature(self, model, location):
+        # Signature of the forecast's current source, None while it has none
+        try:
+            return self._source(model, location)[0]
+        except FileNotFoundError:
+            return None
+
+    def version(self, keys):
+        # Changes whenever any of the (model, location) forecasts in keys does, including one
+        # appearing or disappearing. The files are checked at most once per poll_interval
+        # seconds, not on every call.
+        keys = tuple(keys)
+        now = time.monotonic()
+        cached = self._version
+        if cached is not None and cached[0] == keys and now - cached[1] < self.poll_interval:
+            return cached[2]
+        version = tuple(self._signature(model, location) for model, location in keys)
+        self._version = (keys, now, version)
+        return version
+
+    def preload(self):
+        # Build, up front, everything worth sharing between forked workers: without a packed
+        # file the CSVs are packed into an in-memory store, then every forecast's views into
+        # it go into the LRU. Workers forked afterwards inherit both copy-on-write instead of each building
+        # their own. Returns the number of forecasts loaded.
+        store = self._current_store()
+        if store is not None:
+            keys = list(store[1].index)
+        else:
+            found = list_forecast_csvs(self.base_dir)
+            signatures = {(model, location): file_signature(path) for model, location, path in found}
+            self._preloaded = (signatures, ForecastStore(buffer=pack_bytes(self.base_dir)[0]))
+            keys = list(signatures)
+        self.max_entries = max(self.max_entries, len(keys))
+        for model, location in keys:
+            self.get(model, location)
+        return len(keys)
+
+    def _load_csv(self, path, signature):
+        df = pd.read_csv(path)
+        return self._load_columns(signature, {name: encode_column(name, df[name]) for name in df.columns})
+
+    def _load_columns(self, signature, columns):
+        times = columns["DateTime"][1].astype('datetime64[s]')
+        return ForecastEntry(signature, np.char.replace(np.datetime_as_string(times, unit='s'), 'T', ' '), columns)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
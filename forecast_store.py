@@ -0,0 +1,148 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# One packed file per forecast cycle, holding every model and location
+FORECAST_STORE_NAME = 'forecasts.fcst'
+
+MAGIC = b'FCSTORE1'
+# Column blocks start on cache-line boundaries so every column view is aligned
+ALIGNMENT = 64
+
+
+def decimal_list(values):
+    # Float array -> list of Python floats using the shortest repr of each value, so float32
+    # 1.89 comes back as 1.89 and not 1.8899999856948853. NaN becomes None for JSON.
+    decimal = np.asarray(values).astype(str).astype(np.float64)
+    return [None if v != v else v for v in decimal.tolist()]
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def encode_column(name, series):
+    # -> (column header, numpy array to write)
+    if name == 'DateTime':
+        values = pd.to_datetime(series).to_numpy().astype('datetime64[s]').astype('<i8')
+        return {"name": name, "kind": "datetime", "dtype": "<i8"}, values
+    if not pd.api.types.is_numeric_dtype(series):
+        # Compass columns (Wdir_comp, dir1_comp, ...): small integer codes, -1 for missing
+        categorical = pd.Categorical(series)
+        values = categorical.codes.astype('<i1')
+        return {"name": name, "kind": "category", "dtype": "<i1", "categories": [str(c) for c in categorical.categories]}, values
+    return {"name": name, "kind": "float", "dtype": "<f4"}, series.to_numpy(dtype='<f4')
+
+
+def column_list(column, values):
+    # One column's values as plain Python lists in the CSV's representation, for JSON responses
+    if column["kind"] == "datetime":
+        return [s.replace('T', ' ') for s in np.datetime_as_string(values.astype('datetime64[s]'), unit='s')]
+    if column["kind"] == "category":
+        categories = column["categories"]
+        return [categories[code] if code >= 0 else None for code in values.tolist()]
+    return decimal_list(values)
+
+
+def list_forecast_csvs(forecast_dfs_dir):
+    # [(model, location, path)] for every <model>/<location>.csv, in a stable order
+    found = []
+    for model in sorted(os.listdir(forecast_dfs_dir)):
+        model_dir = os.path.join(forecast_dfs_dir, model)
+        if not os.path.isdir(model_dir):
+            continue
+        for filename in sorted(os.listdir(model_dir)):
+            if filename.endswith('.csv'):
+                found.append((model, filename[:-4], os.path.join(model_dir, filename)))
+    return found
+
+
+def pack_bytes(forecast_dfs_dir):
+    # Pack every <model>/<location>.csv under forecast_dfs_dir into one columnar buffer:
+    #   MAGIC | uint64 header length | JSON header | padding | aligned column blocks
+    # The header lists the columns with their offsets, an index of (model, location) row ranges
+    # and the (mtime, size) of each CSV packed, so readers can tell when one has changed since.
+    frames, index, sources, start = [], {}, {}, 0
+    for model, location, path in list_forecast_csvs(forecast_dfs_dir):
+        st = os.stat(path)
+        df = pd.read_csv(path)
+        index[f"{model}/{location}"] = [start, start + len(df)]
+        sources[f"{model}/{location}"] = [st.st_mtime_ns, st.st_size]
+        start += len(df)
+        frames.append(df)
+    if not frames:
+        raise FileNotFoundError(f"No forecast CSVs found under {forecast_dfs_dir}")
+
+    data = pd.concat(frames, ignore_index=True)
+    columns, blocks, offset = [], [], 0
+    for name in data.columns:
+        column, values = encode_column(name, data[name])
+        column["offset"] = offset
+        columns.append(column)
+        blocks.append(values)
+        offset = _align(offset + values.nbytes)
+
+    header = json.dumps({"n_rows": len(data), "columns": columns, "index": index, "sources": sources}).encode('utf-8')
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    buffer = bytearray(data_start + offset)
+    buffer[:len(MAGIC)] = MAGIC
+    buffer[len(MAGIC):len(MAGIC) + 8] = len(header).to_bytes(8, 'little')
+    buffer[len(MAGIC) + 8:len(MAGIC) + 8 + len(header)] = header
+    for column, values in zip(columns, blocks):
+        position = data_start + column["offset"]
+        buffer[position:position + values.nbytes] = values.tobytes()
+    return bytes(buffer), len(index)
+
+
+def pack_cycle(forecast_dfs_dir, out_path):
+    # Write pack_bytes() to out_path atomically; returns the number of forecasts packed
+    data, packed = pack_bytes(forecast_dfs_dir)
+    tmp_path = f"{out_path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, out_path)
+    return packed
+
+
+class ForecastStore:
+    # Read-only, memory-mapped view of a packed cycle. Slicing a (model, location) returns
+    # numpy views into the mapping, so nothing is parsed or copied and all processes that
+    # open the same file share its pages through the OS cache. A store can also wrap an
+    # in-memory buffer from pack_bytes(), which forked workers share copy-on-write.
+    def __init__(self, path=None, buffer=None):
+        self.path = path
+        if buffer is not None:
+            self._buffer = np.frombuffer(buffer, dtype=np.uint8)
+        else:
+            self._buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path or 'buffer'} is not a packed forecast file")
+        header_length = int.from_bytes(bytes(self._buffer[len(MAGIC):len(MAGIC) + 8]), 'little')
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(self._buffer[header_start:header_start + header_length]))
+        data_start = _align(header_start + header_length)
+
+        self.n_rows = header["n_rows"]
+        self.index = {tuple(key.split('/', 1)): tuple(rows) for key, rows in header["index"].items()}
+        # Files packed before sources were recorded have none
+        self.sources = {tuple(key.split('/', 1)): tuple(signature) for key, signature in header.get("sources", {}).items()}
+        self.column_names = [column["name"] for column in header["columns"]]
+        self._columns = {}
+        for column in header["columns"]:
+            values = np.frombuffer(self._buffer, dtype=column["dtype"], count=self.n_rows,
+                                   offset=data_start + column["offset"])
+            self._columns[column["name"]] = (column, values)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def column(self, name):
+        # (column header, view of the whole column across every forecast)
+        return self._columns[name]
+
+    def columns(self, model, location):
+        # {column name: (column header, numpy view)}
+        start, stop = self.index[(model, location)]
+        return {name: (column, values[start:stop]) for name, (column, values) in self._columns.items()}
@@ -0,0 +1,17 @@
+import os
+
+# Import the app, and with it the current forecast cycle, once in the master process; forked
+# workers then share the preloaded forecast data copy-on-write. FORECAST_PRELOAD=0 disables it.
+preload_app = os.environ.get('FORECAST_PRELOAD', '1') != '0'
+
+
+def when_ready(server):
+    if preload_app:
+        from app import preload
+        loaded = preload()
+        server.log.info("Preloaded %d forecasts before forking workers", loaded)
+
+# Pages keep a /api/events stream open, so serve with gevent workers: an idle stream is then a
+# parked greenlet, not a blocked worker. Sync workers (-k sync) refuse streams and pages poll.
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('FORECAST_WORKER_CONNECTIONS', '1000'))
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow is only needed to build the variants, not to serve them
+    Image = features = None
+
+LOCATION_IMAGES_DIR = os.path.join('static', 'location_images')
+DERIVED_IMAGES_DIR = os.path.join(LOCATION_IMAGES_DIR, 'derived')
+MANIFEST_PATH = os.path.join(DERIVED_IMAGES_DIR, 'manifest.json')
+
+# Target widths for the srcset; sources are never upscaled
+WIDTHS = (480, 960, 1440)
+
+# Output formats, best first, with their encoder settings
+FORMATS = (
+    ('avif', {'quality': 60, 'speed': 6}),
+    ('webp', {'quality': 80, 'method': 6}),
+)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _build_location(location, source_path, source_hash, out_dir):
+    image = Image.open(source_path)
+    image.load()
+    width, height = image.size
+    widths = sorted({min(w, width) for w in WIDTHS})
+
+    variants = []
+    for fmt, options in FORMATS:
+        if not features.check(fmt):
+            continue
+        for target in widths:
+            target_height = round(height * target / width)
+            resized = image if target == width else image.resize((target, target_height), Image.LANCZOS)
+            # The source hash is part of the name, so a file name never refers to two different images
+            filename = f"{location}-{target}w.{source_hash[:12]}.{fmt}"
+            path = os.path.join(out_dir, filename)
+            tmp_path = f"{path}.tmp{os.getpid()}"
+            resized.save(tmp_path, format=fmt.upper(), **options)
+            os.replace(tmp_path, path)
+            variants.append({
+                "format": fmt,
+                "file": filename,
+                "width": target,
+                "height": target_height,
+                "bytes": os.path.getsize(path),
+                "hash": _sha256(path),
+            })
+
+    return {"source_hash": source_hash, "width": width, "height": height, "variants": variants}
+
+
+def build_location_images(source_dir=LOCATION_IMAGES_DIR, out_dir=DERIVED_IMAGES_DIR, force=False):
+    # Write resized AVIF/WebP variants of every location PNG plus a manifest describing them.
+    # Locations whose source hash matches the manifest (and whose files still exist) are skipped.
+    # Returns the list of locations that were (re)built.
+    if Image is None:
+        raise RuntimeError("Building location images requires Pillow (pip install Pillow)")
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    manifest = _load_manifest(manifest_path)
+
+    sources = {
+        os.path.splitext(filename)[0]: os.path.join(source_dir, filename)
+        for filename in sorted(os.listdir(source_dir))
+        if filename.endswith('.png')
+    }
+
+    built = []
+    for location, source_path in sources.items():
+        source_hash = _sha256(source_path)
+        entry = manifest.get(location)
+        if (not force and entry and entry["source_hash"] == source_hash
+                and all(os.path.exists(os.path.join(out_dir, v["file"])) for v in entry["variants"])):
+            continue
+        manifest[location] = _build_location(location, source_path, source_hash, out_dir)
+        built.append(location)
+
+    # Drop entries for deleted sources, then remove files no manifest entry refers to
+    manifest = {location: entry for location, entry in manifest.items() if location in sources}
+    referenced = {v["file"] for entry in manifest.values() for v in entry["variants"]}
+    for filename in os.listdir(out_dir):
+        if filename != 'manifest.json' and filename not in referenced:
+            os.remove(os.path.join(out_dir, filename))
+
+    tmp_path = f"{manifest_path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    return built
+
+
+class ImageManifest:
+    # Read side of the pipeline: srcsets per location, reloaded when the manifest file changes
+    def __init__(self, path=MANIFEST_PATH, url_prefix='/location_images/'):
+        self.path = path
+        self.url_prefix = url_prefix
+        self._signature = None
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature == self._signature:
+            return
+        with self._lock:
+            manifest = _load_manifest(self.path) if signature else {}
+            self._sources = {location: self._picture(entry) for location, entry in manifest.items()}
+            self._signature = signature
+
+    def _picture(self, entry):
+        sources = []
+        for fmt, _ in FORMATS:
+            variants = [v for v in entry["variants"] if v["format"] == fmt]
+            if variants:
+                srcset = ', '.join(f"{self.url_prefix}{v['file']} {v['width']}w" for v in variants)
+                sources.append({"type": f"image/{fmt}", "srcset": srcset})
+        return {"width": entry["width"], "height": entry["height"], "sources": sources}
+
+    def get(self, location):
+        # {'width', 'height', 'sources': [{'type', 'srcset'}]} or None when no variants were built
+        self._refresh()
+        return self._sources.get(location)
+
+    def version(self):
+        self._refresh()
+        return self._signature
@@ -0,0 +1,206 @@
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+import _thread
+import os
+import sys
+import threading
+import time
+from flask import g, request
+
+# Latency buckets in seconds, and response size buckets in bytes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Sampling profiler: off unless FORECAST_PROFILING=1, then triggered per request with ?profile=1
+PROFILING_ENABLED = os.environ.get('FORECAST_PROFILING', '0') == '1'
+PROFILES_DIR = os.environ.get('FORECAST_PROFILES_DIR', 'profiles')
+PROFILE_INTERVAL = 0.001
+
+
+class Histogram:
+    # Cumulative-bucket histogram in the Prometheus exposition format
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class Metrics:
+    # Request timings per route and phase, response sizes per route, and cache statistics
+    # gathered from the callables registered with add_cache(). Every worker process keeps its
+    # own registry and labels its series with its pid, so each series stays monotonic.
+    def __init__(self):
+        self._durations = {}
+        self._sizes = {}
+        self._responses = Counter()
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def add_cache(self, name, stats):
+        # stats() -> dict with hits, misses and hit_ratio, e.g. ForecastCache.stats
+        self._caches[name] = stats
+
+    @contextmanager
+    def phase(self, name):
+        # Time a block of the current request; a phase entered twice accumulates both
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            phases = g.get('phases')
+            if phases is not None:
+                phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+
+    def _before_request(self):
+        g.phases = {}
+        g.request_started = time.perf_counter()
+        if PROFILING_ENABLED and request.args.get('profile') == '1':
+            g.profiler = SamplingProfiler(_os_thread()[1]())
+            g.profiler.start()
+
+    def _after_request(self, response):
+        elapsed = time.perf_counter() - g.request_started
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        phases = g.phases
+        # Body size as sent; streamed file responses report their Content-Length. Generator
+        # bodies (event streams) are not measured: that would buffer them whole.
+        size = response.content_length or (response.calculate_content_length() if response.is_sequence else None) or 0
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            response.headers['X-Profile'] = profiler.stop(route)
+
+        with self._lock:
+            self._histogram(self._durations, (route, 'total'), LATENCY_BUCKETS).observe(elapsed)
+            for name, seconds in phases.items():
+                self._histogram(self._durations, (route, name), LATENCY_BUCKETS).observe(seconds)
+            self._histogram(self._sizes, route, SIZE_BUCKETS).observe(size)
+            self._responses[(route, response.status_code)] += 1
+
+        # Per-request breakdown for browser dev tools
+        response.headers['Server-Timing'] = ', '.join(
+            f'{name};dur={seconds * 1000:.2f}' for name, seconds in list(phases.items()) + [('total', elapsed)]
+        )
+        return response
+
+    @staticmethod
+    def _histogram(histograms, key, buckets):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(buckets)
+        return histogram
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        worker = f'worker="{os.getpid()}"'
+        lines = [
+            '# HELP forecast_request_duration_seconds Time spent per request, by route and phase.',
+            '# TYPE forecast_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            for (route, name), histogram in sorted(self._durations.items()):
+                lines.extend(histogram.samples('forecast_request_duration_seconds', f'{worker},route="{route}",phase="{name}"'))
+            lines += [
+                '# HELP forecast_response_size_bytes Response body size, by route.',
+                '# TYPE forecast_response_size_bytes histogram',
+            ]
+            for route, histogram in sorted(self._sizes.items()):
+                lines.extend(histogram.samples('forecast_response_size_bytes', f'{worker},route="{route}"'))
+            lines += [
+                '# HELP forecast_responses_total Responses sent, by route and status.',
+                '# TYPE forecast_responses_total counter',
+            ]
+            for (route, status), count in sorted(self._responses.items()):
+                lines.append(f'forecast_responses_total{{{worker},route="{route}",status="{status}"}} {count}')
+
+        cache_stats = {name: stats() for name, stats in self._caches.items()}
+        for metric, key, kind, help_text in (
+            ('forecast_cache_hits_total', 'hits', 'counter', 'Cache hits.'),
+            ('forecast_cache_misses_total', 'misses', 'counter', 'Cache misses.'),
+            ('forecast_cache_hit_ratio', 'hit_ratio', 'gauge', 'Hits over lookups since the cache was created.'),
+            ('forecast_cache_entries', 'entries', 'gauge', 'Entries currently held.'),
+        ):
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+            for name, stats in sorted(cache_stats.items()):
+                lines.append(f'{metric}{{{worker},cache="{name}"}} {stats[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _os_thread():
+    # (start_new_thread, get_ident, allocate_lock, sleep) for real OS threads. Under gevent's
+    # monkey patching the threading module's equivalents are greenlets and greenlet ids, which
+    # sys._current_frames() does not know and which cannot preempt a busy request.
+    try:
+        from gevent import monkey
+    except ImportError:
+        return _thread.start_new_thread, _thread.get_ident, _thread.allocate_lock, time.sleep
+    return (monkey.get_original('_thread', 'start_new_thread'), monkey.get_original('_thread', 'get_ident'),
+            monkey.get_original('_thread', 'allocate_lock'), monkey.get_original('time', 'sleep'))
+
+
+class SamplingProfiler:
+    # Samples one OS thread's Python stack every PROFILE_INTERVAL seconds from another OS thread,
+    # and writes the counts as folded stacks ("frame;frame;frame count" per line), the input
+    # format of flamegraph.pl, speedscope and inferno. In a gevent worker the stack sampled is
+    # that of whichever greenlet is running, which for a busy request is the request's own.
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = False
+        self._start_new_thread, _, allocate_lock, self._sleep = _os_thread()
+        # Held by the sampling thread while it runs
+        self._running = allocate_lock()
+
+    def start(self):
+        self._running.acquire()
+        self._start_new_thread(self._run, ())
+
+    def _run(self):
+        try:
+            self._sample()
+        finally:
+            self._running.release()
+
+    def _sample(self):
+        while not self._stopped:
+            self._sleep(self.interval)
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self, route):
+        # Write the profile and return its path
+        self._stopped = True
+        self._running.acquire()
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        name = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'index'
+        path = os.path.join(PROFILES_DIR, f'{name}-{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}.folded')
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
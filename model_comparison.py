@@ -0,0 +1,81 @@
+import numpy as np
+from forecast_store import decimal_list
+
+# Columns compared between models; directions use circular differences
+COMPARE_COLUMNS = ('Hsig_forecast', 'Tpeak_forecast', 'Wdir_forecast', 'wind_direction')
+DIRECTION_COLUMNS = ('Wdir_forecast', 'wind_direction')
+
+
+def circular_difference(a, b):
+    # Signed smallest angle from b to a, in (-180, 180]
+    return 180.0 - np.mod(180.0 - (np.asarray(a) - np.asarray(b)), 360.0)
+
+
+def spread(values, circular=False):
+    # values: (n_models, n_rows) -> (n_rows,) largest difference between any two models
+    if not circular:
+        return np.nanmax(values, axis=0) - np.nanmin(values, axis=0)
+    n_models = values.shape[0]
+    pairs = [(i, j) for i in range(n_models) for j in range(i + 1, n_models)]
+    differences = np.stack([np.abs(circular_difference(values[i], values[j])) for i, j in pairs])
+    return np.nanmax(differences, axis=0)
+
+
+def _aligned_rows(forecast_cache, models, location):
+    # Timesteps present in every model, and each model's row positions for them
+    timesteps = [forecast_cache.get(model, location).timesteps for model in models]
+    common = timesteps[0]
+    for t in timesteps[1:]:
+        common = np.intersect1d(common, t)
+    positions = [np.searchsorted(t, common) for t in timesteps]
+    return common, positions
+
+
+def _missing_models(forecast_cache, models, location):
+    missing = []
+    for model in models:
+        try:
+            forecast_cache.get(model, location)
+        except FileNotFoundError:
+            missing.append(model)
+    return missing
+
+
+def build_comparison(forecast_cache, locations, models):
+    # Per-model values and inter-model spread for every location and timestep. All locations
+    # are concatenated into one (n_models, n_rows) array per column, so each spread is computed
+    # with a single vectorised expression, then split back per location. Locations lacking a
+    # forecast from any model are left out; returns (comparison, {location: missing models}).
+    missing = {location: _missing_models(forecast_cache, models, location) for location in locations}
+    unavailable = {location: models for location, models in missing.items() if models}
+    locations = [location for location in locations if location not in unavailable]
+    aligned = [_aligned_rows(forecast_cache, models, location) for location in locations]
+    bounds = np.cumsum([0] + [len(common) for common, _ in aligned])
+
+    stacked = {}
+    for column in COMPARE_COLUMNS:
+        per_model = []
+        for m, model in enumerate(models):
+            per_model.append(np.concatenate([
+                forecast_cache.arrays(model, location, [column])[column][positions[m]]
+                for location, (_, positions) in zip(locations, aligned)
+            ]) if locations else np.empty(0))
+        stacked[column] = np.stack(per_model)
+
+    spreads = {
+        column: spread(values.astype(np.float64), circular=column in DIRECTION_COLUMNS)
+        for column, values in stacked.items()
+    }
+
+    comparison = {}
+    for i, location in enumerate(locations):
+        start, stop = bounds[i], bounds[i + 1]
+        comparison[location] = {
+            "timesteps": aligned[i][0].tolist(),
+            "models": {
+                model: {column: decimal_list(stacked[column][m, start:stop]) for column in COMPARE_COLUMNS}
+                for m, model in enumerate(models)
+            },
+            "spread": {column: decimal_list(np.round(values[start:stop], 4)) for column, values in spreads.items()},
+        }
+    return comparison, unavailable
@@ -0,0 +1,61 @@
+from collections import OrderedDict, namedtuple
+import hashlib
+import threading
+from flask import make_response, request
+
+# Rendered HTML for one page version, with the strong ETag derived from its bytes
+RenderedPage = namedtuple('RenderedPage', ['body', 'etag'])
+
+
+class PageCache:
+    # Bounded LRU of rendered pages. Keys include everything the page depends on
+    # (page, location, forecast version), so stale entries are never hit and simply age out.
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+            self.misses += 1
+
+        body = render().encode('utf-8')
+        page = RenderedPage(body, hashlib.sha1(body).hexdigest())
+
+        with self._lock:
+            self._pages[key] = page
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._pages),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def page_response(page, content_type='text/html; charset=utf-8'):
+    # Pages sit behind Basic auth and change every forecast cycle: let browsers keep a
+    # private copy but revalidate it, answering If-None-Match with 304 when it still matches
+    response = make_response(page.body)
+    response.content_type = content_type
+    response.set_etag(page.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
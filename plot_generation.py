@@ -0,0 +1,300 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+from html import escape
+import json
+import os
+import numpy as np
+import pandas as pd
+from forecast_store import list_forecast_csvs
+from plot_index import parse_plot_filename, scan_plots
+from static_files import COMPRESSED_SUFFIXES
+from tides import prediction_times
+
+# Bump when the rendered output changes, so every plot is regenerated once
+PLOT_VERSION = '2'
+
+# Per output directory: '<model>/<location>' -> input hash and the file rendered from it
+PLOTS_MANIFEST = '.plots.json'
+
+# Below this many plots a process pool costs more than it saves
+PARALLEL_MIN_PLOTS = 16
+
+# Tide plots cover the forecast period at this resolution
+TIDE_PLOT_HOURS = 144
+TIDE_PLOT_STEP_MINUTES = 30
+
+# Chart geometry, in SVG user units
+WIDTH, HEIGHT, MARGIN = 960, 260, 48
+
+# Wave columns are coloured by peak period: (upper bound in seconds, colour, legend label)
+PERIOD_BANDS = ((8.0, '#c7e9b4', '< 8 s'), (11.0, '#7fcdbb', '8-11 s'),
+                (14.0, '#41b6c4', '11-14 s'), (np.inf, '#225ea8', '14 s +'))
+WAVE_ARROW_COLOUR, WIND_ARROW_COLOUR = '#1f3fbf', '#2ca02c'
+
+# Arrow pointing up, centred on the origin; rotated to a direction and scaled per timestep
+ARROW_PATH = 'M0,-7 L5,1 L1.5,1 L1.5,7 L-1.5,7 L-1.5,1 L-5,1 Z'
+
+
+def input_hash(path):
+    digest = hashlib.sha256(PLOT_VERSION.encode())
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _scale(values, low, high, out_low, out_high):
+    span = (high - low) or 1.0
+    return out_low + (np.asarray(values, dtype=np.float64) - low) / span * (out_high - out_low)
+
+
+def _chart_frame(title, times):
+    # -> (x of every timestep, opening SVG parts: title and day gridlines)
+    seconds = times.to_numpy().astype('datetime64[s]').astype(np.int64)
+    first, last = (int(seconds.min()), int(seconds.max())) if len(seconds) else (0, 1)
+    x = _scale(seconds, first, last, MARGIN, WIDTH - MARGIN)
+    parts = [f'<svg viewBox="0 0 {WIDTH} {HEIGHT}" width="100%" role="img" aria-label="{escape(title)}">',
+             f'<text x="{MARGIN}" y="20" font-weight="bold">{escape(title)}</text>']
+    days = pd.date_range(times.min().normalize(), times.max(), freq='D')[1:] if len(times) else []
+    for day in days:
+        day_x = _scale([day.timestamp()], first, last, MARGIN, WIDTH - MARGIN)[0]
+        parts.append(f'<line x1="{day_x:.1f}" y1="{MARGIN}" x2="{day_x:.1f}" y2="{HEIGHT - MARGIN}" stroke="#ddd"/>')
+        parts.append(f'<text x="{day_x + 4:.1f}" y="{HEIGHT - MARGIN + 16}" font-size="11">{day:%a %d %b}</text>')
+    return x, parts
+
+
+def _arrow(x, y, direction, colour, scale=1.0, tooltip=''):
+    # Arrow glyph at (x, y) pointing the way the wave or wind travels; directions are the
+    # nautical "coming from", hence the extra 180 degrees
+    return (f'<path d="{ARROW_PATH}" fill="{colour}" transform="translate({x:.1f},{y:.1f}) '
+            f'rotate({np.mod(direction + 180.0, 360.0):.0f}) scale({scale:.2f})"><title>{tooltip}</title></path>')
+
+
+def _chart_svg(title, times, series):
+    # One time-series chart as inline SVG: a polyline per series, day gridlines, and a <title>
+    # tooltip on every point
+    x, parts = _chart_frame(title, times)
+    for i, (values, label, colour, axis) in enumerate(series):
+        finite = values[np.isfinite(values)]
+        # Axes start at zero unless the series goes below it, as tide heights can
+        low, high = (min(float(finite.min()), 0.0), float(finite.max()) * 1.1) if len(finite) else (0.0, 1.0)
+        y = _scale(np.nan_to_num(values), low, high, HEIGHT - MARGIN, MARGIN)
+        points = ' '.join(f'{a:.1f},{b:.1f}' for a, b in zip(x, y))
+        parts.append(f'<polyline points="{points}" fill="none" stroke="{colour}" stroke-width="2"/>')
+        for a, b, t, v in zip(x, y, times, values):
+            parts.append(f'<circle cx="{a:.1f}" cy="{b:.1f}" r="3" fill="{colour}"><title>{t:%a %d %b %H:%M} {escape(label)}: {v:.2f}</title></circle>')
+        axis_x = MARGIN - 6 if axis == 0 else WIDTH - MARGIN + 6
+        anchor = 'end' if axis == 0 else 'start'
+        parts.append(f'<text x="{axis_x}" y="{MARGIN}" font-size="11" text-anchor="{anchor}" fill="{colour}">{high:.1f}</text>')
+        parts.append(f'<text x="{axis_x}" y="{HEIGHT - MARGIN}" font-size="11" text-anchor="{anchor}" fill="{colour}">{low:.1f}</text>')
+        parts.append(f'<text x="{MARGIN + 200 * i}" y="{HEIGHT - 8}" font-size="12" fill="{colour}">■ {escape(label)}</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def _wave_chart_svg(times, height, period, direction):
+    # Wave height as columns coloured by peak period, with the wave direction drawn as an
+    # arrow above every column
+    x, parts = _chart_frame("Waves", times)
+    width = max((WIDTH - 2 * MARGIN) / max(len(times), 1) * 0.8, 1.0)
+    finite = height[np.isfinite(height)]
+    high = float(finite.max()) * 1.1 if len(finite) and finite.max() > 0 else 1.0
+    # Room above the tallest column for its arrow
+    top = _scale(np.nan_to_num(height), 0.0, high, HEIGHT - MARGIN, MARGIN + 12)
+    bands = np.searchsorted([upper for upper, _, _ in PERIOD_BANDS], np.nan_to_num(period), side='right')
+    for a, b, t, h, tp, d, band in zip(x, top, times, height, period, direction, bands):
+        tooltip = f'{t:%a %d %b %H:%M} Hs {h:.2f} m, Tp {tp:.0f} s, from {d:.0f}°'
+        parts.append(f'<rect x="{a - width / 2:.1f}" y="{b:.1f}" width="{width:.1f}" height="{HEIGHT - MARGIN - b:.1f}" '
+                     f'fill="{PERIOD_BANDS[min(band, len(PERIOD_BANDS) - 1)][1]}"><title>{tooltip}</title></rect>')
+        if np.isfinite(d):
+            parts.append(_arrow(a, b - 9, d, WAVE_ARROW_COLOUR, min(width / 10, 1.0), tooltip))
+    parts.append(f'<text x="{MARGIN - 6}" y="{MARGIN + 12}" font-size="11" text-anchor="end">{high:.1f} m</text>')
+    parts.append(f'<text x="{MARGIN - 6}" y="{HEIGHT - MARGIN}" font-size="11" text-anchor="end">0</text>')
+    parts.append(f'<text x="{MARGIN}" y="{HEIGHT - 8}" font-size="12">Wave period:</text>')
+    for i, (_, colour, label) in enumerate(PERIOD_BANDS):
+        parts.append(f'<text x="{MARGIN + 90 + 80 * i}" y="{HEIGHT - 8}" font-size="12" fill="{colour}">■ {escape(label)}</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def _wind_chart_svg(times, speed, direction):
+    # Wind as one arrow per timestep, pointing downwind and sized by speed
+    x, parts = _chart_frame("Wind", times)
+    finite = speed[np.isfinite(speed)]
+    fastest = float(finite.max()) if len(finite) and finite.max() > 0 else 1.0
+    middle = (HEIGHT - MARGIN + MARGIN) / 2
+    for a, t, v, d in zip(x, times, speed, direction):
+        if np.isfinite(v) and np.isfinite(d):
+            tooltip = f'{t:%a %d %b %H:%M} Wind {v:.0f} kts from {d:.0f}°'
+            parts.append(_arrow(a, middle, d, WIND_ARROW_COLOUR, 0.6 + 2.4 * v / fastest, tooltip))
+    parts.append(f'<text x="{MARGIN}" y="{HEIGHT - 8}" font-size="12" fill="{WIND_ARROW_COLOUR}">'
+                 f'Arrow size: wind speed, largest {fastest:.0f} kts</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def _page_html(title, svgs):
+    body = '\n'.join(svgs)
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="UTF-8">'
+        f'<title>{escape(title)}</title>'
+        '<style>body{font-family:sans-serif;margin:0}svg{display:block}</style></head>\n'
+        f'<body>\n{body}\n</body></html>\n'
+    )
+
+
+def render_plot_html(title, times, charts):
+    # charts: [(chart title, [(values, label, colour, axis)])] -> standalone HTML page
+    return _page_html(title, [_chart_svg(chart_title, times, series) for chart_title, series in charts])
+
+
+def render_forecast_plot(csv_path, title):
+    # Columns for wave height coloured by period with direction arrows, then wind arrows sized
+    # by speed, as the location page describes them
+    df = pd.read_csv(csv_path)
+    times = pd.to_datetime(df['DateTime'])
+
+    def column(name):
+        return df[name].to_numpy(dtype=np.float64) if name in df else np.full(len(df), np.nan)
+
+    svgs = [_wave_chart_svg(times, column('Hsig_forecast'), column('Tpeak_forecast'), column('Wdir_forecast'))]
+    if 'wind_speed_kts' in df and 'wind_direction' in df:
+        svgs.append(_wind_chart_svg(times, column('wind_speed_kts'), column('wind_direction')))
+    return _page_html(title, svgs)
+
+
+def _write_atomic(path, text):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _render_task(task):
+    # Runs in a pool worker: render one plot and write it
+    out_path, render, args = task
+    _write_atomic(out_path, render(*args))
+    return out_path
+
+
+def _render_all(tasks, workers):
+    # tasks: [(output path, render function, its arguments)]; without workers, small batches
+    # are rendered in this process
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(tasks) >= PARALLEL_MIN_PLOTS else 1
+    if workers == 1:
+        for task in tasks:
+            _render_task(task)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_render_task, tasks, chunksize=max(len(tasks) // (workers * 4), 1)))
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def generate_forecast_plots(forecast_dfs_dir, plots_dir, cycle_date, titles=None, workers=None):
+    # Write plots_dir/<model>/<location>_<cycle_date>.html for every forecast CSV. A plot whose
+    # input hash is unchanged is not re-rendered: the existing file is linked to the new name.
+    # Superseded plots are removed, keeping the previous cycle's for pages rendered before the
+    # swap. Returns (rendered, reused). Cycle-stamped plots are served as immutable, so raises
+    # FileExistsError, before writing anything, if one exists with different input.
+    titles = titles or {}
+    manifest_path = os.path.join(plots_dir, PLOTS_MANIFEST)
+    manifest = _load_manifest(manifest_path)
+
+    forecasts = [(model, location, csv_path, input_hash(csv_path))
+                 for model, location, csv_path in list_forecast_csvs(forecast_dfs_dir)]
+    changed = [
+        f'{model}/{location}_{cycle_date}.html' for model, location, _, digest in forecasts
+        if os.path.isfile(os.path.join(plots_dir, model, f'{location}_{cycle_date}.html'))
+        and manifest.get(f'{model}/{location}') != {"hash": digest, "file": f'{location}_{cycle_date}.html'}
+    ]
+    if changed:
+        raise FileExistsError(f"{len(changed)} plots for cycle {cycle_date} already exist and their forecasts (or the "
+                              f"plot format) have changed, e.g. {changed[0]}; generate them under a new cycle date")
+
+    tasks, reused, updated = [], 0, {}
+    for model, location, csv_path, digest in forecasts:
+        model_dir = os.path.join(plots_dir, model)
+        os.makedirs(model_dir, exist_ok=True)
+        filename = f'{location}_{cycle_date}.html'
+        out_path = os.path.join(model_dir, filename)
+        key = f'{model}/{location}'
+        previous = manifest.get(key)
+        updated[key] = {"hash": digest, "file": filename}
+
+        if previous and previous["hash"] == digest:
+            previous_path = os.path.join(model_dir, previous["file"])
+            if previous["file"] == filename and os.path.isfile(out_path):
+                reused += 1
+                continue
+            if os.path.isfile(previous_path):
+                tmp_path = f'{out_path}.tmp{os.getpid()}'
+                try:
+                    os.link(previous_path, tmp_path)
+                    os.replace(tmp_path, out_path)
+                    reused += 1
+                    continue
+                except OSError:
+                    pass
+        title = f"{titles.get(location, location)} ({model})"
+        tasks.append((out_path, render_forecast_plot, (csv_path, title)))
+
+    _render_all(tasks, workers)
+
+    keep = {}
+    for key, entry in updated.items():
+        model = key.split('/', 1)[0]
+        keep.setdefault(model, set()).add(entry["file"])
+        if key in manifest:
+            keep[model].add(manifest[key]["file"])
+    for model, filenames in keep.items():
+        _prune(os.path.join(plots_dir, model), filenames)
+
+    os.makedirs(plots_dir, exist_ok=True)
+    tmp_manifest = f'{manifest_path}.tmp{os.getpid()}'
+    with open(tmp_manifest, 'w') as f:
+        json.dump(updated, f, indent=1, sort_keys=True)
+    os.replace(tmp_manifest, manifest_path)
+    return len(tasks), reused
+
+
+def generate_tide_plots(tide_table, plots_dir, cycle_date, start, spots, hours=TIDE_PLOT_HOURS,
+                        step_minutes=TIDE_PLOT_STEP_MINUTES, workers=None):
+    # Write plots_dir/<location>_<cycle_date>.html for every spot with tidal constants, from
+    # start (UTC) for `hours`, labelled in each spot's local time. Heights for all spots come
+    # from one batched prediction; only the rendering is spread over processes.
+    # spots: {location: (title, UTC offset in hours)}. Returns the number of plots written.
+    locations = [location for location in spots if location in tide_table]
+    times = prediction_times(start, hours, step_minutes)
+    heights = tide_table.predict(locations, times)
+
+    os.makedirs(plots_dir, exist_ok=True)
+    previous, _ = scan_plots(plots_dir)
+    tasks = []
+    for location, series in zip(locations, heights):
+        title, utc_offset = spots[location]
+        local_times = times + pd.Timedelta(hours=utc_offset)
+        charts = [(f"Tide (UTC{utc_offset:+g})", [(series, 'Tide height (m)', '#17becf', 0)])]
+        tasks.append((os.path.join(plots_dir, f'{location}_{cycle_date}.html'), render_plot_html,
+                      (f"{title} tide", local_times, charts)))
+    _render_all(tasks, workers)
+
+    # Keep the previous cycle's plots for pages rendered before the swap
+    _prune(plots_dir, {os.path.basename(path) for path, _, _ in tasks} | set(previous.values()))
+    return len(tasks)
+
+
+def _prune(directory, keep):
+    # Remove cycle-stamped plots (and their compressed variants) whose plot is not in keep
+    for filename in os.listdir(directory):
+        source = filename.rsplit('.', 1)[0] if filename.endswith(COMPRESSED_SUFFIXES) else filename
+        parsed = parse_plot_filename(source)
+        if parsed and parsed[1].isdigit() and source not in keep:
+            os.remove(os.path.join(directory, filename))
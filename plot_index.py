@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from static_files import COMPRESSED_SUFFIXES
+
+
+def parse_plot_filename(filename):
+    # '<location>_<cycle date>.<ext>' -> (location, cycle date). Location names can contain
+    # underscores themselves (el_salvador), so the date is whatever follows the last one.
+    stem = os.path.splitext(filename)[0]
+    if '_' not in stem:
+        return None
+    location, date = stem.rsplit('_', 1)
+    return location, date
+
+
+def is_cycle_stamped(filename):
+    # Cycle-stamped files are never rewritten under the same name, so they can be cached forever
+    parsed = parse_plot_filename(filename)
+    return parsed is not None and parsed[1].isdigit()
+
+
+def scan_plots(directory):
+    # -> ({location: newest plot filename}, newest cycle date or None)
+    latest = {}
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if filename.endswith(COMPRESSED_SUFFIXES):
+                continue
+            parsed = parse_plot_filename(filename)
+            if parsed is None:
+                continue
+            location, date = parsed
+            if location not in latest or date > latest[location][0]:
+                latest[location] = (date, filename)
+    plots = {location: filename for location, (date, filename) in latest.items()}
+    cycle_date = max((date for date, _ in latest.values()), default=None)
+    return plots, cycle_date
+
+
+class PlotIndex:
+    # Maps location -> newest plot file in a directory. The listing is rebuilt only when the
+    # directory's mtime changes, and the mtime is polled at most once per poll_interval seconds.
+    def __init__(self, directory, poll_interval=1.0):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._mtime = None
+        self._checked = 0.0
+        self._plots = {}
+        self._cycle_date = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked < self.poll_interval:
+            return
+        with self._lock:
+            if now - self._checked < self.poll_interval:
+                return
+            try:
+                mtime = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self._mtime:
+                self._plots, self._cycle_date = scan_plots(self.directory)
+                self._mtime = mtime
+            self._checked = now
+
+    def get(self, location):
+        self._refresh()
+        return self._plots.get(location)
+
+    def cycle_date(self):
+        self._refresh()
+        return self._cycle_date
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import threading
+from static_files import compress_directory
+
+# Pre-rendered pages live in <cycle>/site/ (site/ for the legacy layout), described by site.json
+SITE_DIR = 'site'
+SITE_MANIFEST = 'site.json'
+
+# Below this many pages a process pool costs more than it saves
+PARALLEL_MIN_PAGES = 200
+
+
+def page_version(key):
+    # Page cache keys are tuples of strings, numbers, None and nested tuples; JSON makes them
+    # comparable with the keys read back from site.json
+    return json.dumps(key)
+
+
+def write_site(site_dir, pages):
+    # pages: {relative path: (page cache key, html)}. Pages and their .gz/.br variants are
+    # written into a fresh directory which then replaces site_dir, so a reader never sees a
+    # page without its variants or a manifest describing pages that are not there yet.
+    staging_dir = f"{site_dir.rstrip(os.sep)}.staging{os.getpid()}"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    try:
+        for name, (_, html) in pages.items():
+            path = os.path.join(staging_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(html)
+        compress_directory(staging_dir)
+        with open(os.path.join(staging_dir, SITE_MANIFEST), 'w') as f:
+            json.dump({name: page_version(key) for name, (key, _) in pages.items()}, f, indent=2, sort_keys=True)
+
+        old_dir = f"{site_dir.rstrip(os.sep)}.old{os.getpid()}"
+        if os.path.isdir(site_dir):
+            os.rename(site_dir, old_dir)
+        os.rename(staging_dir, site_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return len(pages)
+
+
+class PrerenderedSite:
+    # Read side: which pre-rendered pages exist and which page version each one was rendered
+    # from. A page is served from disk only while its version still matches what the view would
+    # render now; otherwise the view renders it as usual.
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, SITE_MANIFEST)
+        self._signature = None
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.manifest_path)
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature == self._signature:
+            return
+        with self._lock:
+            versions = {}
+            if signature is not None:
+                try:
+                    with open(self.manifest_path) as f:
+                        versions = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    signature = None
+            self._versions = versions
+            self._signature = signature
+
+    def get(self, name, key):
+        # True when name was pre-rendered from the page version identified by key
+        self._refresh()
+        return self._versions.get(name) == page_version(key)
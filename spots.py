@@ -0,0 +1,133 @@
+from bisect import bisect_left, bisect_right
+import heapq
+import json
+import numpy as np
+
+# Spot registry: id -> name, timezone, utc_offset, lat, lon, the arrow_positions used on the
+# location page, and the region, swell_window and offshore_wind used to score surf quality
+# (surf_quality.py)
+SPOTS_FILE = 'spots.json'
+
+# Mean Earth radius
+EARTH_RADIUS_KM = 6371.0088
+
+# Points per KD-tree leaf; leaves are scanned with one vectorised distance computation
+LEAF_SIZE = 32
+
+
+def _unit_vectors(lat, lon):
+    # lat/lon in degrees -> points on the unit sphere. The straight-line (chord) distance between
+    # two of them grows monotonically with their haversine distance, so nearest neighbours by
+    # chord are nearest neighbours on the sphere.
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2.0, 1.0))
+
+
+class KDTree:
+    # Static KD-tree over 3D points: each node splits its points at the median of its widest
+    # axis and keeps their bounding box. Queries visit nodes nearest-box-first and stop once no
+    # remaining box can hold a closer point.
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.order = np.arange(len(self.points))
+        self.leaf_size = leaf_size
+        self.starts, self.stops, self.children, lows, highs = [], [], [], [], []
+        if len(self.points):
+            self._build(0, len(self.points), lows, highs)
+        self.lows, self.highs = np.array(lows), np.array(highs)
+
+    def _build(self, start, stop, lows, highs):
+        node = len(self.starts)
+        points = self.points[self.order[start:stop]]
+        self.starts.append(start)
+        self.stops.append(stop)
+        self.children.append(None)
+        lows.append(points.min(axis=0))
+        highs.append(points.max(axis=0))
+        if stop - start > self.leaf_size:
+            axis = int(np.argmax(highs[node] - lows[node]))
+            middle = (start + stop) // 2
+            partition = np.argpartition(points[:, axis], middle - start)
+            self.order[start:stop] = self.order[start:stop][partition]
+            self.children[node] = (self._build(start, middle, lows, highs), self._build(middle, stop, lows, highs))
+        return node
+
+    def _box_distance(self, node, point):
+        # Squared distance from point to the node's bounding box, 0 inside it
+        gap = np.maximum(self.lows[node] - point, 0.0) + np.maximum(point - self.highs[node], 0.0)
+        return float(gap @ gap)
+
+    def query(self, point, k):
+        # -> [(distance, index)] of the k nearest points, nearest first
+        if not self.starts or k < 1:
+            return []
+        point = np.asarray(point, dtype=np.float64)
+        best = []  # max-heap of (-squared distance, index)
+        nodes = [(self._box_distance(0, point), 0)]
+        while nodes:
+            bound, node = heapq.heappop(nodes)
+            if len(best) == k and bound > -best[0][0]:
+                break
+            children = self.children[node]
+            if children is None:
+                indexes = self.order[self.starts[node]:self.stops[node]]
+                distances = ((self.points[indexes] - point) ** 2).sum(axis=1)
+                for distance, index in zip(distances.tolist(), indexes.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, index))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, index))
+            else:
+                for child in children:
+                    heapq.heappush(nodes, (self._box_distance(child, point), child))
+        return [(distance ** 0.5, index) for distance, index in sorted((-d, i) for d, i in best)]
+
+
+class SpotRegistry:
+    # The spots loaded from SPOTS_FILE, in file order, with a KD-tree for nearest-spot queries
+    # and the spots sorted by latitude for bounding-box queries
+    def __init__(self, path=SPOTS_FILE):
+        with open(path, encoding='utf-8') as f:
+            self.spots = json.load(f)
+        self.ids = list(self.spots)
+        self.lat = np.array([spot["lat"] for spot in self.spots.values()], dtype=np.float64)
+        self.lon = np.array([spot["lon"] for spot in self.spots.values()], dtype=np.float64)
+        self.tree = KDTree(_unit_vectors(self.lat, self.lon))
+        self._by_lat = np.argsort(self.lat, kind='stable')
+        self._sorted_lat = self.lat[self._by_lat].tolist()
+
+    def __contains__(self, spot_id):
+        return spot_id in self.spots
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, spot_id):
+        return self.spots[spot_id]
+
+    def items(self):
+        return self.spots.items()
+
+    def nearest(self, lat, lon, k=5):
+        # -> [(spot id, great-circle distance in km)], nearest first
+        point = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+        return [(self.ids[index], float(chord_to_km(chord))) for chord, index in self.tree.query(point, k)]
+
+    def in_bbox(self, west, south, east, north):
+        # Spot ids inside a lat/lon box, in file order. west > east is a box crossing the
+        # antimeridian; boxes 360 degrees wide or more (a zoomed-out map) take every longitude.
+        first, last = bisect_left(self._sorted_lat, south), bisect_right(self._sorted_lat, north)
+        candidates = np.sort(self._by_lat[first:last])
+        if east - west < 360:
+            lon = self.lon[candidates]
+            west, east = (west + 180) % 360 - 180, (east + 180) % 360 - 180
+            inside = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+            candidates = candidates[inside]
+        return [self.ids[index] for index in candidates.tolist()]
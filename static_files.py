@@ -0,0 +1,123 @@
+from functools import lru_cache
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # .br variants are only produced when the brotli package is installed
+    brotli = None
+
+# Precompressed siblings, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSED_SUFFIXES = tuple(suffix for _, suffix in ENCODINGS)
+
+# Only text formats are worth compressing; images are already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+# One year, the conventional maximum for immutable assets
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+@lru_cache(maxsize=4096)
+def _hash_file(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def content_hash(path):
+    # Hashes are memoised on (path, mtime, size), so each file version is read once
+    st = os.stat(path)
+    return _hash_file(path, st.st_mtime_ns, st.st_size)
+
+
+def _is_fresh_variant(path, variant):
+    # A variant older than its source was made from a previous version of the file
+    try:
+        return os.stat(variant).st_mtime_ns >= os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def send_precompressed(directory, filename, immutable=False):
+    # Serve a file, or its .br/.gz sibling when the client accepts that encoding.
+    # ETags are content hashes of the bytes actually sent, so Range and If-None-Match
+    # requests are answered against the encoded representation.
+    path = safe_join(os.path.abspath(directory), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    served_path, encoding = path, None
+    for candidate, suffix in ENCODINGS:
+        if request.accept_encodings[candidate] and _is_fresh_variant(path, path + suffix):
+            served_path, encoding = path + suffix, candidate
+            break
+
+    response = send_file(served_path, mimetype=mimetype, download_name=os.path.basename(path),
+                         etag=content_hash(served_path), conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+
+    # Everything is behind Basic auth, so shared caches must not store it
+    response.cache_control.private = True
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def compress_directory(directory):
+    # Write .gz (and .br when available) siblings for every compressible file in a directory tree.
+    # Variants newer than their source are left alone, so re-running after a cycle only
+    # compresses the new files. Returns the number of variants written.
+    written = 0
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith(COMPRESSED_SUFFIXES) or '.tmp' in filename:
+                continue
+            mimetype = mimetypes.guess_type(filename)[0] or ''
+            if not mimetype.startswith(COMPRESSIBLE_TYPES):
+                continue
+
+            path = os.path.join(root, filename)
+            source_mtime = os.stat(path).st_mtime_ns
+            data = None
+            for encoding, suffix in ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                variant = path + suffix
+                if os.path.exists(variant) and os.stat(variant).st_mtime_ns >= source_mtime:
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                if encoding == 'br':
+                    compressed = brotli.compress(data, quality=11)
+                else:
+                    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                # A variant that is not smaller is useless; drop any stale one instead
+                if len(compressed) >= len(data):
+                    if os.path.exists(variant):
+                        os.remove(variant)
+                    continue
+                _write_atomic(variant, compressed)
+                written += 1
+    return written
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+import threading
+import numpy as np
+from model_comparison import circular_difference
+
+# Swell partitions in the forecast CSVs: (height, period, direction) columns
+SWELL_PARTITIONS = (('swellheight1', 'swellperiod1', 'dir1'),
+                    ('swellheight2', 'swellperiod2', 'dir2'),
+                    ('swellheight3', 'swellperiod3', 'dir3'))
+WIND_COLUMNS = ('wind_speed_kts', 'wind_direction')
+
+# Swell arriving this many degrees outside a spot's window fades out linearly to nothing
+WINDOW_TAPER_DEG = 30.0
+
+# Swell counts from MIN_PERIOD_S, in full from GOOD_PERIOD_S
+MIN_PERIOD_S, GOOD_PERIOD_S = 6.0, 14.0
+
+# Effective swell height scoring the full size component
+IDEAL_HEIGHT_M = 2.0
+
+# Onshore wind of this strength or more leaves nothing of the score
+WIND_LIMIT_KTS = 20.0
+
+# A session is a run of consecutive timesteps at one spot scoring at least this (out of 10)
+SESSION_MIN_SCORE = 3.0
+
+# Sessions examined per step when answering a query, best first
+QUERY_CHUNK = 1024
+
+
+def _outside_window(direction, window):
+    # Degrees by which each direction falls outside the clockwise window [from, to]; 0 inside
+    low, high = window[..., 0], window[..., 1]
+    inside = np.mod(direction - low, 360.0) <= np.mod(high - low, 360.0)
+    distance = np.minimum(np.abs(circular_difference(direction, low)), np.abs(circular_difference(direction, high)))
+    return np.where(inside, 0.0, distance)
+
+
+def score(columns, swell_window, offshore_wind):
+    # Quality 0-10 per timestep. columns: {column: float array} over any number of rows;
+    # swell_window: (n, 2) and offshore_wind: (n,) per-row spot parameters, so the forecasts
+    # of every spot are scored in one pass.
+    energy = np.zeros(len(offshore_wind))
+    for height_column, period_column, direction_column in SWELL_PARTITIONS:
+        height = np.nan_to_num(columns[height_column])
+        period = np.clip((np.nan_to_num(columns[period_column]) - MIN_PERIOD_S) / (GOOD_PERIOD_S - MIN_PERIOD_S), 0.0, 1.0)
+        aligned = np.clip(1.0 - _outside_window(np.nan_to_num(columns[direction_column]), swell_window) / WINDOW_TAPER_DEG, 0.0, 1.0)
+        energy += (height * aligned) ** 2 * period
+    size = np.clip(np.sqrt(energy) / IDEAL_HEIGHT_M, 0.0, 1.0)
+
+    # 0 for offshore wind, 1 for dead onshore, weighted by strength
+    onshore = (1.0 - np.cos(np.radians(circular_difference(columns['wind_direction'], offshore_wind)))) / 2.0
+    wind = 1.0 - np.nan_to_num(onshore) * np.clip(np.nan_to_num(columns['wind_speed_kts']) / WIND_LIMIT_KTS, 0.0, 1.0)
+    return np.round(10.0 * size * wind, 1)
+
+
+class SessionIndex:
+    # Every model's sessions (see SESSION_MIN_SCORE) across all spots of one cycle, sorted by
+    # peak score. A query walks them best first, in chunks, until it has enough that match its
+    # time range and region, so it only touches the sessions it could return.
+    def __init__(self, forecast_cache, spots, models):
+        self.locations = list(spots)
+        self.regions = sorted({spots[location]["region"] for location in self.locations})
+        self._region_of = np.array([self.regions.index(spots[location]["region"]) for location in self.locations],
+                                   dtype=np.int32)
+        self._sessions = {model: self._build(forecast_cache, spots, model) for model in models}
+
+    def _build(self, forecast_cache, spots, model):
+        names = [column for partition in SWELL_PARTITIONS for column in partition] + list(WIND_COLUMNS)
+        columns = {name: [np.zeros(0)] for name in names}
+        times, spot_rows = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int32)]
+        for i, location in enumerate(self.locations):
+            try:
+                forecast = forecast_cache.get(model, location)
+            except FileNotFoundError:
+                # Spots registered ahead of their forecasts have no sessions yet
+                continue
+            for name in names:
+                columns[name].append(np.asarray(forecast.columns[name][1], dtype=np.float64))
+            # Forecast timesteps are the spot's local time; sessions are kept in UTC epoch seconds
+            local = forecast.columns["DateTime"][1]
+            times.append(local.astype(np.int64) - int(spots[location]["utc_offset"] * 3600))
+            spot_rows.append(np.full(len(local), i, dtype=np.int32))
+        columns = {name: np.concatenate(values) for name, values in columns.items()}
+        times, spot = np.concatenate(times), np.concatenate(spot_rows)
+
+        windows = np.array([spots[location]["swell_window"] for location in self.locations], dtype=np.float64)
+        offshore = np.array([spots[location]["offshore_wind"] for location in self.locations], dtype=np.float64)
+        scores = score(columns, windows.reshape(-1, 2)[spot], offshore[spot])
+
+        # Runs of good timesteps, split wherever the spot changes
+        good = scores >= SESSION_MIN_SCORE
+        new_run = good & ~np.concatenate([[False], good[:-1] & (spot[1:] == spot[:-1])])
+        run = np.cumsum(new_run) - 1
+        rows = np.flatnonzero(good)
+        # Each run's first row, last row and best row (earliest of equal scores)
+        first = rows[np.flatnonzero(new_run[rows])]
+        last = rows[np.concatenate([np.flatnonzero(new_run[rows])[1:] - 1, [len(rows) - 1]])] if len(rows) else rows
+        by_score = rows[np.lexsort((-scores[rows], run[rows]))]
+        peak = by_score[np.flatnonzero(np.concatenate([[True], run[by_score][1:] != run[by_score][:-1]]))] if len(rows) else rows
+
+        order = np.lexsort((times[peak], -scores[peak]))
+        return {
+            "score": scores[peak][order], "time": times[peak][order], "spot": spot[peak][order],
+            "start": times[first][order], "end": times[last][order],
+        }
+
+    def best(self, model, start=None, end=None, region=None, limit=10):
+        # Up to `limit` sessions peaking between start and end (epoch seconds, inclusive), best first
+        sessions = self._sessions[model]
+        found = []
+        for offset in range(0, len(sessions["score"]), QUERY_CHUNK):
+            chunk = slice(offset, offset + QUERY_CHUNK)
+            match = np.ones(len(sessions["score"][chunk]), dtype=bool)
+            if start is not None:
+                match &= sessions["time"][chunk] >= start
+            if end is not None:
+                match &= sessions["time"][chunk] <= end
+            if region is not None:
+                match &= self._region_of[sessions["spot"][chunk]] == self.regions.index(region)
+            found.extend((offset + np.flatnonzero(match)).tolist())
+            if len(found) >= limit:
+                break
+        return [
+            {"location": self.locations[sessions["spot"][i]], "score": float(sessions["score"][i]),
+             "peak": int(sessions["time"][i]), "start": int(sessions["start"][i]), "end": int(sessions["end"][i])}
+            for i in found[:limit]
+        ]
+
+
+class SessionIndexCache:
+    # The session index of the most recent forecast versions, built once per version per worker
+    def __init__(self, max_entries=2):
+        self.max_entries = max_entries
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version, build):
+        with self._lock:
+            index = self._indexes.get(version)
+            if index is None:
+                index = self._indexes[version] = build()
+                while len(self._indexes) > self.max_entries:
+                    self._indexes.popitem(last=False)
+            return index
@@ -0,0 +1,148 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+# Harmonic constants, one row per (location, constituent): location,constituent,amplitude,phase
+# with amplitude in metres and phase the Greenwich phase lag in degrees (UTC). A 'Z0' row gives
+# the mean level above chart datum; its phase is ignored. Lines starting with '#' are comments.
+TIDE_CONSTITUENTS = os.path.join('tides', 'constituents.csv')
+
+# Doodson numbers (tau, s, h, p, N', p1) and phase offset in degrees of each supported constituent
+CONSTITUENTS = {
+    'M2': ((2, 0, 0, 0, 0, 0), 0), 'S2': ((2, 2, -2, 0, 0, 0), 0), 'N2': ((2, -1, 0, 1, 0, 0), 0),
+    'K2': ((2, 2, 0, 0, 0, 0), 0), '2N2': ((2, -2, 0, 2, 0, 0), 0), 'MU2': ((2, -2, 2, 0, 0, 0), 0),
+    'NU2': ((2, -1, 2, -1, 0, 0), 0), 'L2': ((2, 1, 0, -1, 0, 0), 180), 'T2': ((2, 2, -3, 0, 0, 1), 0),
+    'K1': ((1, 1, 0, 0, 0, 0), 90), 'O1': ((1, -1, 0, 0, 0, 0), -90), 'P1': ((1, 1, -2, 0, 0, 0), -90),
+    'Q1': ((1, -2, 0, 1, 0, 0), -90), 'M4': ((4, 0, 0, 0, 0, 0), 0), 'MS4': ((4, 2, -2, 0, 0, 0), 0),
+    'MN4': ((4, -1, 0, 1, 0, 0), 0), 'M6': ((6, 0, 0, 0, 0, 0), 0), 'MM': ((0, 1, 0, -1, 0, 0), 0),
+    'MF': ((0, 2, 0, 0, 0, 0), 0), 'SSA': ((0, 0, 2, 0, 0, 0), 0), 'SA': ((0, 0, 1, 0, 0, 0), 0),
+}
+NAMES = list(CONSTITUENTS)
+DOODSON = np.array([CONSTITUENTS[name][0] for name in NAMES], dtype=np.float64)
+OFFSETS = np.array([CONSTITUENTS[name][1] for name in NAMES], dtype=np.float64)
+
+# J2000.0 epoch, 2000-01-01 12:00 UTC, in Unix seconds
+J2000 = 946728000
+
+
+def _centuries(seconds):
+    return (np.asarray(seconds, dtype=np.float64) - J2000) / (36525 * 86400.0)
+
+
+def _node_longitude(seconds):
+    # Longitude of the Moon's ascending node, degrees
+    return 125.0445 - 1934.1363 * _centuries(seconds)
+
+
+def astronomical_arguments(seconds):
+    # Unix seconds (UTC) -> (6, n) mean lunar time and the mean longitudes s, h, p, N' = -N and
+    # p1, in degrees
+    seconds = np.asarray(seconds, dtype=np.float64)
+    T = _centuries(seconds)
+    s = 218.3164 + 481267.8812 * T
+    h = 280.4661 + 36000.7698 * T
+    p = 83.3532 + 4069.0137 * T
+    N = _node_longitude(seconds)
+    p1 = 282.9384 + 1.7195 * T
+    hours = np.mod(seconds, 86400.0) / 3600.0
+    tau = 15.0 * hours + 180.0 + h - s
+    return np.stack([tau, s, h, p, -N, p1])
+
+
+def nodal_corrections(seconds):
+    # Amplitude factors f and phase corrections u (degrees) of every constituent, from the
+    # longitude of the Moon's node at the given time. They change over an 18.6 year cycle, so
+    # one evaluation serves a whole prediction window.
+    N = np.radians(_node_longitude(seconds))
+    f_m2 = 1.0004 - 0.0373 * np.cos(N) + 0.0002 * np.cos(2 * N)
+    u_m2 = -2.14 * np.sin(N)
+    f_k1 = 1.006 + 0.115 * np.cos(N) - 0.0088 * np.cos(2 * N) + 0.0006 * np.cos(3 * N)
+    u_k1 = -8.86 * np.sin(N) + 0.68 * np.sin(2 * N) - 0.07 * np.sin(3 * N)
+    f_o1 = 1.0089 + 0.1871 * np.cos(N) - 0.0147 * np.cos(2 * N) + 0.0014 * np.cos(3 * N)
+    u_o1 = 10.80 * np.sin(N) - 1.34 * np.sin(2 * N) + 0.19 * np.sin(3 * N)
+    f_k2 = 1.0241 + 0.2863 * np.cos(N) + 0.0083 * np.cos(2 * N) - 0.0015 * np.cos(3 * N)
+    u_k2 = -17.74 * np.sin(N) + 0.68 * np.sin(2 * N) - 0.04 * np.sin(3 * N)
+    f_mf = 1.043 + 0.414 * np.cos(N)
+    u_mf = -23.74 * np.sin(N) + 2.68 * np.sin(2 * N) - 0.38 * np.sin(3 * N)
+    f_mm = 1.0 - 0.130 * np.cos(N) + 0.0013 * np.cos(2 * N)
+
+    corrections = {
+        'M2': (f_m2, u_m2), 'N2': (f_m2, u_m2), '2N2': (f_m2, u_m2), 'MU2': (f_m2, u_m2),
+        'NU2': (f_m2, u_m2), 'L2': (f_m2, u_m2), 'K1': (f_k1, u_k1), 'O1': (f_o1, u_o1),
+        'Q1': (f_o1, u_o1), 'K2': (f_k2, u_k2), 'M4': (f_m2 ** 2, 2 * u_m2), 'MN4': (f_m2 ** 2, 2 * u_m2),
+        'MS4': (f_m2, u_m2), 'M6': (f_m2 ** 3, 3 * u_m2), 'MF': (f_mf, u_mf), 'MM': (f_mm, 0.0),
+    }
+    f = np.array([corrections.get(name, (1.0, 0.0))[0] for name in NAMES])
+    u = np.array([corrections.get(name, (1.0, 0.0))[1] for name in NAMES])
+    return f, u
+
+
+class TideTable:
+    # Harmonic constants for every spot as (n_locations, n_constituents) matrices, reloaded
+    # when the constituents file changes. predict() evaluates all spots and timesteps at once:
+    #   h = Z0 + sum_i f_i A_i cos(V_i(t) + u_i - G_i)
+    # expanded as cos(a - b) = cos a cos b + sin a sin b, i.e. two matrix products of
+    # (n_locations, n_constituents) by (n_constituents, n_times).
+    def __init__(self, path=TIDE_CONSTITUENTS):
+        self.path = path
+        self._signature = None
+        self._tables = self._empty()
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature != self._signature:
+            with self._lock:
+                self._tables = self._load() if signature else self._empty()
+                self._signature = signature
+        return self._tables
+
+    @staticmethod
+    def _empty():
+        return {}, np.zeros((0, len(NAMES))), np.zeros((0, len(NAMES))), np.zeros(0)
+
+    def _load(self):
+        df = pd.read_csv(self.path, comment='#')
+        unknown = set(df['constituent']) - set(NAMES) - {'Z0'}
+        if unknown:
+            raise ValueError(f"Unsupported tidal constituents in {self.path}: {', '.join(sorted(unknown))}")
+        locations = list(dict.fromkeys(df['location']))
+        rows = {location: i for i, location in enumerate(locations)}
+        amplitude = np.zeros((len(locations), len(NAMES)))
+        phase = np.zeros((len(locations), len(NAMES)))
+        mean_level = np.zeros(len(locations))
+        columns = {name: i for i, name in enumerate(NAMES)}
+        for location, constituent, a, g in df[['location', 'constituent', 'amplitude', 'phase']].itertuples(index=False):
+            if constituent == 'Z0':
+                mean_level[rows[location]] = a
+            else:
+                amplitude[rows[location], columns[constituent]] = a
+                phase[rows[location], columns[constituent]] = g
+        return rows, amplitude, np.radians(phase), mean_level
+
+    def __contains__(self, location):
+        return location in self._refresh()[0]
+
+    def predict(self, locations, times):
+        # locations: spot ids in the table; times: UTC datetimes -> (n_locations, n_times) heights in metres
+        rows, amplitude, phase, mean_level = self._refresh()
+        index = [rows[location] for location in locations]
+        seconds = pd.DatetimeIndex(times).as_unit('s').asi8.astype(np.float64)
+        if not len(seconds):
+            return np.zeros((len(index), 0))
+        f, u = nodal_corrections(seconds[len(seconds) // 2])
+        arguments = np.radians(DOODSON @ astronomical_arguments(seconds) + (OFFSETS + u)[:, None])
+        amplitude = amplitude[index] * f
+        return (mean_level[index][:, None]
+                + (amplitude * np.cos(phase[index])) @ np.cos(arguments)
+                + (amplitude * np.sin(phase[index])) @ np.sin(arguments))
+
+
+def prediction_times(start, hours, step_minutes):
+    # Evenly spaced UTC timestamps from start, covering `hours`
+    return pd.date_range(pd.Timestamp(start), periods=int(hours * 60 // step_minutes) + 1, freq=f'{step_minutes}min')
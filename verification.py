@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from bias_correction import BASE_MODEL
+from model_comparison import circular_difference
+
+# Buoy observations, one CSV per location: observations/<location>.csv with a DateTime column
+# (UTC) and any of the observed columns below, appended to as new batches arrive
+OBSERVATIONS_DIR = 'observations'
+VERIFICATION_STATE = os.path.join('verification', 'state.json')
+
+# Bumped when stored aggregates can no longer be trusted; older state is discarded and rebuilt.
+# 2: valid times in UTC (they were spot local time), watermarks per archived cycle.
+# 3: fully verified cycles compacted into a per-location floor.
+STATE_VERSION = 3
+
+# Forecast column -> observed column
+VERIFIED_COLUMNS = {'Hsig_forecast': 'Hsig', 'Tpeak_forecast': 'Tpeak', 'Wdir_forecast': 'Wdir'}
+DIRECTION_COLUMNS = ('Wdir_forecast',)
+
+# An observation verifies the forecast valid at the nearest time within this window
+MATCH_TOLERANCE = pd.Timedelta(minutes=30)
+
+# Lead times are grouped into buckets of this many hours: 0 is leads 0-23h, 24 is 24-47h, ...
+LEAD_BUCKET_HOURS = 24
+
+# Skill scores compare each model's MSE with this model's
+REFERENCE_MODEL = BASE_MODEL
+
+# Running sums kept per (location, model, lead bucket, column); every statistic derives from them
+SUMS = ('n', 'sum_error', 'sum_squared_error', 'sum_observed')
+
+
+def _statistics(sums, reference_sums, circular):
+    n = sums['n']
+    if not n:
+        return None
+    mse = sums['sum_squared_error'] / n
+    rmse = mse ** 0.5
+    mean_observed = sums['sum_observed'] / n
+    reference_mse = reference_sums['sum_squared_error'] / reference_sums['n'] if reference_sums and reference_sums['n'] else None
+    return {
+        "n": n,
+        "bias": round(sums['sum_error'] / n, 4),
+        "rmse": round(rmse, 4),
+        # Scatter index is relative to the mean observation, which has no meaning for directions
+        "scatter_index": None if circular or not mean_observed else round(rmse / mean_observed, 4),
+        "skill": round(1.0 - mse / reference_mse, 4) if reference_mse else None,
+    }
+
+
+def _empty_state():
+    return {"version": STATE_VERSION, "watermarks": {}, "aggregates": {}}
+
+
+def _last_valid(entry):
+    return entry["issue"] + entry["max_lead"]
+
+
+class Verification:
+    # Error aggregates of archived forecasts against buoy observations. Each location keeps
+    #   floor:    issue time up to which every cycle archived by `sequence` is fully verified
+    #   sequence: the archive's latest sequence number (archiving order) when it was set
+    #   cycles:   {issue time: valid time verified through} for the cycles not covered by the
+    #             floor, i.e. those still within their forecast range of the observations and
+    #             any archived late below the floor
+    # update() folds in only forecasts past their cycle's watermark, so every (forecast,
+    # observation) pair is counted exactly once and a cycle archived late is still verified in
+    # full. It visits the cycles after the floor and those archived since `sequence`, found by
+    # bisecting the catalog, so neither its cost nor the state grows with the archive's history.
+    def __init__(self, state_path=VERIFICATION_STATE):
+        self.state_path = state_path
+        self._signature = None
+        self._state = _empty_state()
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.state_path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature == self._signature:
+            return self._state
+        with self._lock:
+            state = _empty_state()
+            if signature is not None:
+                with open(self.state_path) as f:
+                    stored = json.load(f)
+                if stored.get("version") == STATE_VERSION:
+                    state = stored
+            self._state, self._signature = state, signature
+            return state
+
+    def _save(self, state):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp_path, self.state_path)
+
+    def update(self, archive, observations_dir=OBSERVATIONS_DIR, models=None):
+        # Fold newly verifiable forecasts into the aggregates; returns the number of pairs added.
+        # A forecast is verifiable once observations exist past its valid time plus the match
+        # window, so no later observation can be a closer match.
+        # The cached state is shared with readers: update copies of its two dicts, replacing
+        # rather than mutating what they hold
+        current = self._refresh()
+        aggregates, watermarks = dict(current["aggregates"]), dict(current["watermarks"])
+        state = {"version": STATE_VERSION, "watermarks": watermarks, "aggregates": aggregates}
+        if not os.path.isdir(observations_dir):
+            return 0
+
+        added = 0
+        for filename in sorted(os.listdir(observations_dir)):
+            if not filename.endswith('.csv'):
+                continue
+            location = filename[:-4]
+            observed = pd.read_csv(os.path.join(observations_dir, filename), parse_dates=['DateTime'])
+            observed = observed.dropna(subset=['DateTime']).sort_values('DateTime')
+            if observed.empty:
+                continue
+            verified_until = int((observed['DateTime'].iloc[-1] - MATCH_TOLERANCE).value // 10**9)
+
+            mark = watermarks.get(location, {"floor": None, "sequence": 0, "cycles": {}})
+            floor, cycles = mark["floor"], dict(mark["cycles"])
+            after_floor = archive.entries(after=floor)
+            pending = {entry["issue"]: entry for entry in after_floor}
+            sequence = mark["sequence"]
+            for entry in archive.appended(mark["sequence"]):
+                pending.setdefault(entry["issue"], entry)
+                sequence = max(sequence, entry["sequence"])
+            for issue in cycles:
+                if int(issue) not in pending:
+                    pending[int(issue)] = archive.entry(int(issue))
+
+            # Per cycle: verify from its watermark to the newest verifiable time, or its last
+            # valid time if that comes first
+            frames = []
+            for issue_time, entry in sorted(pending.items()):
+                issue = str(issue_time)
+                through = min(verified_until, _last_valid(entry))
+                if through < issue_time or (issue in cycles and cycles[issue] >= through):
+                    continue
+                start = pd.Timestamp(cycles[issue] + 1, unit='s') if issue in cycles else None
+                forecasts = archive.cycle_between(issue_time, start, pd.Timestamp(through, unit='s'),
+                                                  locations=[location], models=models, columns=list(VERIFIED_COLUMNS))
+                if not forecasts.empty:
+                    frames.append(forecasts)
+                cycles[issue] = through
+
+            # Raise the floor over the run of cycles now verified to their last valid time, and
+            # forget the watermarks it covers
+            for entry in after_floor:
+                if cycles.get(str(entry["issue"]), -1) < _last_valid(entry):
+                    break
+                floor = entry["issue"]
+            cycles = {issue: through for issue, through in cycles.items()
+                      if floor is None or int(issue) > floor or through < _last_valid(pending[int(issue)])}
+            watermarks[location] = {"floor": floor, "sequence": sequence, "cycles": cycles}
+
+            if frames:
+                forecasts = pd.concat(frames, ignore_index=True).sort_values('valid_time')
+                forecasts['valid_time'] = forecasts['valid_time'].astype(observed['DateTime'].dtype)
+                pairs = pd.merge_asof(forecasts, observed, left_on='valid_time', right_on='DateTime',
+                                      direction='nearest', tolerance=MATCH_TOLERANCE)
+                pairs['lead'] = (pairs['lead_hours'] // LEAD_BUCKET_HOURS * LEAD_BUCKET_HOURS).astype(int)
+                added += self._accumulate(aggregates, location, pairs)
+
+        self._save(state)
+        return added
+
+    @staticmethod
+    def _accumulate(aggregates, location, pairs):
+        # Add one location's (forecast, observation) pairs to the running sums, vectorised per column
+        added = 0
+        for column, observed_column in VERIFIED_COLUMNS.items():
+            if observed_column not in pairs:
+                continue
+            valid = pairs[[column, observed_column]].notna().all(axis=1)
+            subset = pairs.loc[valid, ['model', 'lead']].copy()
+            if subset.empty:
+                continue
+            forecast = pairs.loc[valid, column].to_numpy(dtype=np.float64)
+            observed = pairs.loc[valid, observed_column].to_numpy(dtype=np.float64)
+            error = circular_difference(forecast, observed) if column in DIRECTION_COLUMNS else forecast - observed
+            subset['n'] = 1
+            subset['sum_error'] = error
+            subset['sum_squared_error'] = error ** 2
+            subset['sum_observed'] = observed
+            for (model, lead), sums in subset.groupby(['model', 'lead'])[list(SUMS)].sum().iterrows():
+                key = f"{location}|{model}|{lead}|{column}"
+                current = dict(aggregates.get(key) or dict.fromkeys(SUMS, 0))
+                current['n'] += int(sums['n'])
+                for name in SUMS[1:]:
+                    current[name] += float(sums[name])
+                aggregates[key] = current
+            added += len(subset)
+        return added
+
+    def summary(self, location=None, model=None, column=None, reference=REFERENCE_MODEL, pooled=False):
+        # Statistics per (location, model, lead bucket, column), or per (model, lead bucket,
+        # column) across every location when pooled
+        aggregates = self._refresh()["aggregates"]
+        grouped = {}
+        for key, sums in aggregates.items():
+            key_location, key_model, lead, key_column = key.split('|')
+            if (location and key_location != location) or (column and key_column != column):
+                continue
+            group = ('all' if pooled else key_location, key_model, int(lead), key_column)
+            total = grouped.setdefault(group, dict.fromkeys(SUMS, 0))
+            for name in SUMS:
+                total[name] += sums[name]
+
+        rows = []
+        for (key_location, key_model, lead, key_column), sums in sorted(grouped.items()):
+            if model and key_model != model:
+                continue
+            statistics = _statistics(sums, grouped.get((key_location, reference, lead, key_column)),
+                                     key_column in DIRECTION_COLUMNS)
+            if statistics:
+                rows.append({"location": key_location, "model": key_model, "lead_hours": lead,
+                             "column": key_column, **statistics})
+        return rows